@@ -34,9 +34,9 @@ debuglog = None
 # Available proxies.
 import LocalProxy
 try:
-    from xmlrpc.client import ServerProxy
+    from xmlrpc.client import ServerProxy, MultiCall
 except:
-    from xmlrpclib import ServerProxy
+    from xmlrpclib import ServerProxy, MultiCall
 
 
 class AIPSDisk:
@@ -82,6 +82,148 @@ for disk in range(1, 72):
 log = None
 
 
+class _AIPSBatchResult:
+
+    """Class representing the result of a call that was queued in a
+       batch.  The result becomes available once the batch has been
+       sent."""
+
+    def __init__(self, transform=None):
+        self._transform = transform
+        self._done = False
+        self._value = None
+        self._exception = None
+        return
+
+    def _set(self, value):
+        try:
+            if self._transform:
+                value = self._transform(value)
+                pass
+            self._value = value
+        except Exception as exception:
+            self._exception = exception
+            pass
+        self._done = True
+        return
+
+    def _fail(self, exception):
+        self._exception = exception
+        self._done = True
+        return
+
+    def done(self):
+        """Return True if the result is available."""
+        return self._done
+
+    def result(self):
+        """Return the result of the call, or raise the exception
+           raised by the call."""
+        if not self._done:
+            raise RuntimeError('batch has not been sent yet')
+        if self._exception is not None:
+            raise self._exception
+        return self._value
+
+    pass                                # class _AIPSBatchResult
+
+
+class _AIPSBatch:
+
+    """Class representing a batch of calls.  Calls to remote proxies
+       are queued and sent as a single XML-RPC multicall request per
+       proxy when the batch is left.  Calls to the local proxy are
+       done immediately."""
+
+    def __init__(self):
+        self._queues = {}
+        self._previous = None
+        return
+
+    def __enter__(self):
+        global _batch
+        self._previous = _batch
+        _batch = self
+        return self
+
+    def __exit__(self, type, value, traceback):
+        global _batch
+        _batch = self._previous
+        if type is None:
+            self.send()
+            pass
+        return False
+
+    def call(self, url, name, args, func, transform=None):
+        """Queue a call of method NAME with arguments ARGS on the proxy
+           at URL.  If URL is None, FUNC is called immediately
+           instead.  Returns an object that provides the result of
+           the call through its result() method once the batch has
+           been sent."""
+        result = _AIPSBatchResult(transform)
+        if not url:
+            try:
+                value = func(*args)
+            except Exception as exception:
+                result._fail(exception)
+            else:
+                result._set(value)
+                pass
+            return result
+        self._queues.setdefault(url, []).append((name, args, result))
+        return result
+
+    def send(self):
+        """Send the queued calls."""
+        queues = self._queues
+        self._queues = {}
+        for url in queues:
+            calls = queues[url]
+            multicall = MultiCall(ServerProxy(url, allow_none=True))
+            for name, args, result in calls:
+                getattr(multicall, name)(*args)
+                continue
+            try:
+                results = multicall()
+            except Exception as exception:
+                for name, args, result in calls:
+                    result._fail(exception)
+                    continue
+                continue
+            for i in range(len(calls)):
+                try:
+                    value = results[i]
+                except Exception as exception:
+                    calls[i][2]._fail(exception)
+                else:
+                    calls[i][2]._set(value)
+                    pass
+                continue
+            continue
+        return
+
+    pass                                # class _AIPSBatch
+
+
+# Active batch.
+_batch = None
+
+def batch():
+    """Start a batch of calls.
+
+    Within the batch, calls on AIPSImage and AIPSUVData objects (and
+    their extension tables) return result objects instead of the
+    actual results.  Calls to remote machines are sent as a single
+    request per machine when the batch is left, after which the
+    results are available through the result() method:
+
+    >>> with AIPS.batch():
+    ...     headers = [uvdata.header for uvdata in catalogue]
+    >>> print(headers[0].result().object)
+    """
+    return _AIPSBatch()
+
+
 # The code below is the result of a serious design flaw.  It should
 # really die, but removing it will probably affect most scripts.
 
@@ -113,6 +255,9 @@ class _AIPS(object):
         sys.modules[__name__].debuglog = value
     debuglog = property(_get_debuglog, _set_debuglog)
 
+    def batch(self):
+        return sys.modules[__name__].batch()
+
     pass                                # class _AIPS
 
 AIPS = _AIPS()
@@ -87,8 +87,7 @@ class _AIPSDataMethod:
         self.name = name
 
     def __call__(self, *args):
-        func = self.inst._method(self.name)
-        return func(self.inst.desc, *args)
+        return self.inst._call(self.name, (self.inst.desc,) + args)
 
 
 class _AIPSDataDesc:
@@ -219,7 +218,8 @@ class _AIPSData(object):
         return _AIPSDataMethod(self, name)
 
     def __len__(self):
-        return _AIPSDataMethod(self, '_len')()
+        # Lengths are needed right away, so never batch this call.
+        return self._method('_len')(self.desc)
 
     def copy(self):
         return self.__class__(self.name, self.klass, self.disk, self.seq,
@@ -231,19 +231,32 @@ class _AIPSData(object):
     def _method(self, name):
         return getattr(getattr(self.proxy, self.__class__.__name__), name)
 
+    def _call(self, name, args, transform=None):
+        """Call method NAME of the proxy with arguments ARGS, applying
+        TRANSFORM to the result.  Within a batch, the call is queued
+        and an object providing the result is returned instead."""
+        if AIPS._batch is None:
+            result = self._method(name)(*args)
+            if transform:
+                result = transform(result)
+                pass
+            return result
+        url = AIPS.disks[self._disk].url
+        return AIPS._batch.call(url, self.__class__.__name__ + '.' + name,
+                                args, self._method(name), transform)
+
     def exists(self):
         """Check whether this image or data set exists.
 
         Returns True if the image or data set exists, False otherwise."""
-        return self._method(_whoami())(self.desc)
+        return self._call(_whoami(), (self.desc,))
 
     def verify(self):
         """Verify whether this image or data set can be accessed."""
-        return self._method(_whoami())(self.desc)
+        return self._call(_whoami(), (self.desc,))
 
     def _generate_header(self):
-        dict = self._method('header')(self.desc)
-        return _AIPSDataHeader(dict)
+        return self._call('header', (self.desc,), _AIPSDataHeader)
     header = property(_generate_header,
                       doc='Header for this data set.')
 
@@ -253,8 +266,7 @@ class _AIPSData(object):
                         doc='Keywords for this data set.')
 
     def _generate_tables(self):
-        dict = self._method('tables')(self.desc)
-        return dict
+        return self._call('tables', (self.desc,))
     tables = property(_generate_tables,
                       doc='Extension tables for this data set.')
 
@@ -266,7 +278,7 @@ class _AIPSData(object):
 
         Returns the highest available version number of the extension
         table TYPE."""
-        return self._method(_whoami())(self.desc, type)
+        return self._call(_whoami(), (self.desc, type))
 
     def rename(self, name=None, klass=None, seq=None, **kwds):
         """Rename this image or data set.
@@ -281,26 +293,27 @@ class _AIPSData(object):
         if 'name' in kwds: name = kwds['name']
         if 'klass' in kwds: klass = kwds['name']
         if 'seq' in kwds: seq = kwds['seq']
-        result = self._method(_whoami())(self.desc, name, klass, seq)
-        self.name = result[0]
-        self.klass = result[1]
-        self.seq = result[2]
-        return result
+        def _renamed(result):
+            self.name = result[0]
+            self.klass = result[1]
+            self.seq = result[2]
+            return result
+        return self._call(_whoami(), (self.desc, name, klass, seq), _renamed)
 
     def zap(self, force=False):
         """Destroy this image or data set."""
-        return self._method(_whoami())(self.desc, force)
+        return self._call(_whoami(), (self.desc, force))
 
     def clrstat(self):
         """Clear all read and write status flags."""
-        return self._method(_whoami())(self.desc)
+        return self._call(_whoami(), (self.desc,))
 
     def header_table(self, type, version):
         """Get the header of an extension table.
 
         Returns the header of version VERSION of the extension table
         TYPE."""
-        return self._method(_whoami())(self.desc, type, version)
+        return self._call(_whoami(), (self.desc, type, version))
 
     # XXX Deprecated.
     def getrow_table(self, type, version, rowno):
@@ -308,7 +321,7 @@ class _AIPSData(object):
 
         Returns row ROWNO from version VERSION of extension table TYPE
         as a dictionary."""
-        return self._method(_whoami())(self.desc, type, version, rowno)
+        return self._call(_whoami(), (self.desc, type, version, rowno))
 
     def zap_table(self, type, version):
         """Destroy an extension table.
@@ -316,25 +329,25 @@ class _AIPSData(object):
         Deletes version VERSION of the extension table TYPE.  If
         VERSION is 0, delete the highest version of table TYPE.  If
         VERSION is -1, delete all versions of table TYPE."""
-        return self._method(_whoami())(self.desc, type, version)
+        return self._call(_whoami(), (self.desc, type, version))
 
     def _generate_antennas(self):
-        return self._method('antennas')(self.desc)
+        return self._call('antennas', (self.desc,))
     antennas = property(_generate_antennas,
                         doc = 'Antennas in this data set.')
 
     def _generate_polarizations(self):
-        return self._method('polarizations')(self.desc)
+        return self._call('polarizations', (self.desc,))
     polarizations = property(_generate_polarizations,
                              doc='Polarizations in this data set.')
 
     def _generate_sources(self):
-        return self._method('sources')(self.desc)
+        return self._call('sources', (self.desc,))
     sources = property(_generate_sources,
                        doc='Sources in this data set.')
 
     def _generate_stokes(self):
-        return self._method('stokes')(self.desc)
+        return self._call('stokes', (self.desc,))
     stokes = property(_generate_stokes,
                       doc='Stokes parameters for this data set.')
 
@@ -362,9 +375,7 @@ class _AIPSTableMethod(_AIPSDataMethod):
         _AIPSDataMethod.__init__(self, inst, name)
 
     def __call__(self, *args):
-        func = self.inst._data._method(self.name + '_table')
-        return func(self.inst._data.desc,
-                    self.inst._name, self.inst._version, *args)
+        return self.inst._call(self.name, args)
 
     pass                                # class _AIPSTableMethod
 
@@ -378,18 +389,29 @@ class _AIPSTableRow(_dictify):
 
 class _AIPSTableIter:
 
-    """This class provides an iterator for AIPS extension tables."""
+    """This class provides an iterator for AIPS extension tables.  Rows
+    are fetched from the proxy in pages of PAGESIZE rows."""
+
+    pagesize = 1000
 
     def __init__(self, table):
         self._table = table
         self._len = len(self._table)
         self._index = 0
+        self._rows = []
+        self._start = 0
         return
 
     def __next__(self):
         if self._index >= self._len:
             raise StopIteration
-        result = self._table[self._index]
+        if self._index - self._start >= len(self._rows):
+            self._start = self._index
+            self._rows = self._table._rows(self._index, self.pagesize)
+            if not self._rows:
+                raise StopIteration
+            pass
+        result = self._rows[self._index - self._start]
         self._index += 1
         return result
 
@@ -411,15 +433,44 @@ class _AIPSTable(object):
     def __getattr__(self, name):
         return _AIPSTableMethod(self, name)
 
+    def _call(self, name, args, transform=None):
+        args = (self._data.desc, self._name, self._version) + args
+        return self._data._call(name + '_table', args, transform)
+
     def __getitem__(self, key):
-        dict = _AIPSTableMethod(self, '_getitem')(key)
-        return _AIPSTableRow(dict)
+        return self._call('_getitem', (key,), _AIPSTableRow)
 
     def __iter__(self):
         return _AIPSTableIter(self)
 
     def __len__(self):
-        return _AIPSTableMethod(self, '_len')()
+        # Lengths are needed right away, so never batch this call.
+        func = self._data._method('_len_table')
+        return func(self._data.desc, self._name, self._version)
+
+    def _rows(self, start, count):
+        # Used for iteration, so never batch this call.
+        func = self._data._method('_getrows_table')
+        rows = func(self._data.desc, self._name, self._version, start, count)
+        return [_AIPSTableRow(dict) for dict in rows]
+
+    def rows(self, start, count):
+        """Get rows from this table.
+
+        Returns up to COUNT rows starting at row START in a single
+        call to the proxy."""
+        return self._call('_getrows', (start, count),
+                          lambda rows: [_AIPSTableRow(dict) for dict in rows])
+
+    def columns(self, start=0, count=None):
+        """Get columns from this table.
+
+        Returns a dictionary that maps the names of the columns to
+        lists of values for up to COUNT rows starting at row START.
+        If COUNT is not specified, all remaining rows are returned."""
+        if count == None:
+            count = len(self) - start
+        return _AIPSTableMethod(self, '_getcolumns')(start, count)
 
     def _generate_keywords(self):
         return _AIPSTableMethod(self, 'keywords')()
@@ -446,8 +497,8 @@ class _AIPSHistoryMethod(_AIPSDataMethod):
         _AIPSDataMethod.__init__(self, inst, name)
 
     def __call__(self, *args):
-        func = self.inst._data._method(self.name + '_history')
-        return func(self.inst._data.desc, *args)
+        return self.inst._data._call(self.name + '_history',
+                                     (self.inst._data.desc,) + args)
 
     pass                                # class _AIPSHistoryMethod
 
@@ -21,6 +21,10 @@ AIPSUVData objects.
 
 """
 
+# Generic Python stuff.
+import threading, time
+from collections import OrderedDict
+
 # Bits from Obit.
 import Obit, OErr, OSystem
 import AIPSDir
@@ -30,12 +34,265 @@ import TableList
 # Wizardry bits.
 from Wizardry.AIPSData import AIPSUVData as WAIPSUVData
 from Wizardry.AIPSData import AIPSImage as WAIPSImage
+from Wizardry.AIPSData import _AIPSTable as _WAIPSTable
+
+class _AIPSDataCache:
+    """This class implements a cache of open data sets and extension
+    tables.  Each entry carries a signature that is compared against
+    the current signature when the entry is looked up, such that
+    entries for data that changed are discarded.  Once the cache holds
+    SIZE entries, the least recently used entry is evicted.
+
+    Handles returned by get() and put() are in use until they are
+    passed to release().  Handles that are removed from the cache
+    while in use are only closed once they are released.  If the cache
+    isn't used for TIMEOUT seconds, all entries are removed, such that
+    data sets and tables are not kept open indefinitely."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._users = {}
+        self._retired = {}
+        self._lock = threading.RLock()
+        self._used = 0
+        self._timer = None
+        return
+
+    def _close(self, handle):
+        if hasattr(handle, 'close'):
+            try:
+                handle.close()
+            except Exception:
+                pass
+            pass
+        return
+
+    def _acquire(self, handle):
+        self._users[id(handle)] = self._users.get(id(handle), 0) + 1
+        self._used = time.time()
+        if self._timer is None:
+            self._schedule(self.timeout)
+            pass
+        return handle
+
+    def _schedule(self, delay):
+        self._timer = threading.Timer(delay, self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+        return
+
+    def _expire(self):
+        self._lock.acquire()
+        try:
+            self._timer = None
+            idle = time.time() - self._used
+            if idle < self.timeout:
+                self._schedule(self.timeout - idle)
+                return
+            for key in list(self._entries.keys()):
+                self._remove(key)
+                continue
+        finally:
+            self._lock.release()
+            pass
+        return
+
+    def _remove(self, key):
+        signature, handle = self._entries.pop(key)
+        if id(handle) in self._users:
+            self._retired[id(handle)] = handle
+        else:
+            self._close(handle)
+            pass
+        return
+
+    def signature(self, key):
+        """Returns the signature of the entry cached under KEY, or
+        None if there is no such entry."""
+        self._lock.acquire()
+        try:
+            if not key in self._entries:
+                return None
+            return self._entries[key][0]
+        finally:
+            self._lock.release()
+            pass
+        pass
+
+    def get(self, key, signature):
+        """Returns the handle cached under KEY if its signature matches
+        SIGNATURE, or None otherwise."""
+        self._lock.acquire()
+        try:
+            if not key in self._entries:
+                return None
+            entry = self._entries.pop(key)
+            self._entries[key] = entry
+            if signature is None or entry[0] != signature:
+                self._remove(key)
+                return None
+            return self._acquire(entry[1])
+        finally:
+            self._lock.release()
+            pass
+        pass
+
+    def put(self, key, signature, handle):
+        """Caches HANDLE under KEY with signature SIGNATURE, unless
+        SIGNATURE is None.  The handle is in use until it is
+        released."""
+        self._lock.acquire()
+        try:
+            self._acquire(handle)
+            if signature is None:
+                self._retired[id(handle)] = handle
+                return
+            if key in self._entries:
+                self._remove(key)
+                pass
+            self._entries[key] = (signature, handle)
+            while len(self._entries) > self.size:
+                self._remove(next(iter(self._entries)))
+                continue
+        finally:
+            self._lock.release()
+            pass
+        return
+
+    def release(self, handle):
+        """Releases HANDLE, closing it if it is no longer cached."""
+        self._lock.acquire()
+        try:
+            users = self._users.pop(id(handle)) - 1
+            if users > 0:
+                self._users[id(handle)] = users
+            elif id(handle) in self._retired:
+                self._close(self._retired.pop(id(handle)))
+                pass
+        finally:
+            self._lock.release()
+            pass
+        return
+
+    def discard(self, prefix):
+        """Removes all entries whose keys start with PREFIX."""
+        self._lock.acquire()
+        try:
+            for key in list(self._entries.keys()):
+                if key[:len(prefix)] == prefix:
+                    self._remove(key)
+                    pass
+                continue
+        finally:
+            self._lock.release()
+            pass
+        return
+
+    pass                           # class _AIPSDataCache
+
+
+# Cache of open data sets and extension tables shared by all proxies.
+_cache = _AIPSDataCache(32, 30.0)
+
 
 class AIPSData:
     def __init__(self):
         self.err = OErr.OErr()
         return
 
+    def _key(self, desc):
+        return (self.type, desc['disk'], desc['userno'], desc['name'],
+                desc['klass'], desc['seq'])
+
+    def _entry(self, desc, cno):
+        """Returns catalogue entry CNO if it holds the data set
+        described by DESC, or None otherwise."""
+        try:
+            entry = AIPSDir.PInfo(desc['disk'], desc['userno'], cno,
+                                  self.err)
+        except OErr.OErr as err:
+            OErr.PClear(err)
+            return None
+        if not entry:
+            return None
+        if entry[0:12].strip() != desc['name'].strip() or \
+           entry[13:19].strip() != desc['klass'].strip() or \
+           int(entry[20:25]) != desc['seq'] or entry[26:28] != self.type:
+            return None
+        return entry
+
+    def _signature(self, desc):
+        """Returns the catalogue slot and catalogue entry of the data
+        set described by DESC, or None if it doesn't exist.
+
+        The entry includes the time stamp of the data set, so the
+        signature changes when the data set is renamed, zapped or
+        modified.  The slot of a cached entry is checked first, which
+        avoids searching the catalogue."""
+        cached = _cache.signature(self._key(desc))
+        if cached is not None:
+            entry = self._entry(desc, cached[0])
+            if entry is not None:
+                return (cached[0], entry)
+            pass
+        assert(not self.err.isErr)
+        cno = Obit.AIPSDirFindCNO(desc['disk'], desc['userno'], desc['name'],
+                                  desc['klass'], self.type,  desc['seq'],
+                                  self.err.me)
+        if cno == -1:
+            OErr.PClear(self.err)
+            return None
+        entry = self._entry(desc, cno)
+        if entry is None:
+            return None
+        return (cno, entry)
+
+    def _open(self, desc, signature=None):
+        """Returns a, possibly cached, Wizardry object for the data
+        set described by DESC.  The object has to be released using
+        _release()."""
+        key = self._key(desc)
+        if signature is None:
+            signature = self._signature(desc)
+            pass
+        data = _cache.get(key, signature)
+        if data is None:
+            data = self._init(desc)
+            _cache.put(key, signature, data)
+            pass
+        return data
+
+    def _table(self, desc, type, version):
+        """Returns a, possibly cached, Wizardry object for version
+        VERSION of extension table TYPE, opened read-only.  The object
+        has to be released using _release()."""
+        signature = self._signature(desc)
+        data = self._open(desc, signature)
+        try:
+            if type.startswith('AIPS '):
+                type = type[5:]
+                pass
+            if version == 0:
+                version = data.table_highver(type)
+                pass
+            key = self._key(desc) + (type, version)
+            table = _cache.get(key, signature)
+            if table is None:
+                table = _WAIPSTable(data._data, type, version, readonly=True)
+                _cache.put(key, signature, table)
+                pass
+        finally:
+            self._release(data)
+            pass
+        return table
+
+    def _release(self, handle):
+        """Releases HANDLE, as returned by _open() or _table()."""
+        _cache.release(handle)
+        return
+
     def exists(self, desc):
         """Checks that this instance of AIPSData refers to a dataset that is
         actually present in the AIPS catalogue."""
@@ -50,104 +307,185 @@ class AIPSData:
         return True
 
     def verify(self, desc):
-        data = self._init(desc)
+        data = self._open(desc)
+        self._release(data)
         return True                # Return something other than None.
 
     def header(self, desc):
         """Returns the data header."""
-        data = self._init(desc)
-        return data.header._generate_dict()
+        data = self._open(desc)
+        try:
+            result = data.header._generate_dict()
+        finally:
+            self._release(data)
+            pass
+        return result
 
     def _len(self, desc):
-        data = self._init(desc)
-        return len(data)
+        data = self._open(desc)
+        try:
+            result = len(data)
+        finally:
+            self._release(data)
+            pass
+        return result
 
     def keywords(self, desc):
-        data = self._init(desc)
-        return data.keywords._generate_dict()
+        data = self._open(desc)
+        try:
+            result = data.keywords._generate_dict()
+        finally:
+            self._release(data)
+            pass
+        return result
 
     def stokes(self, desc):
-        data = self._init(desc)
-        return data.stokes
+        data = self._open(desc)
+        try:
+            result = data.stokes
+        finally:
+            self._release(data)
+            pass
+        return result
 
     def tables(self, desc):
-        data = self._init(desc)
-        return data.tables
+        data = self._open(desc)
+        try:
+            result = data.tables
+        finally:
+            self._release(data)
+            pass
+        return result
 
     def table_highver(self, desc, type):
         """Returns the highest version number of the specified table type."""
-        data = self._init(desc)
-        return data.table_highver(type)
+        data = self._open(desc)
+        try:
+            result = data.table_highver(type)
+        finally:
+            self._release(data)
+            pass
+        return result
 
     def rename(self, desc, name, klass, seq):
         """Renames the data set."""
-        data = self._init(desc)
-        return data.rename(name, klass, seq)
+        data = self._open(desc)
+        _cache.discard(self._key(desc))
+        try:
+            result = data.rename(name, klass, seq)
+        finally:
+            self._release(data)
+            pass
+        return result
 
     def zap(self, desc, force):
         """Removes the data set from the AIPS catalogue."""
-        self._init(desc).zap(force)
+        data = self._open(desc)
+        _cache.discard(self._key(desc))
+        try:
+            data.zap(force)
+        finally:
+            self._release(data)
+            pass
         return True                # Return something other than None.
 
     def clrstat(self, desc):
         """Unsets the 'busy' state in the AIPS catalogue. Useful should an
 		AIPS task die mid-step."""
-        self._init(desc).clrstat()
+        data = self._open(desc)
+        try:
+            data.clrstat()
+        finally:
+            self._release(data)
+            pass
         return True                # Return something other than None.
 
     def keywords_table(self, desc, type, version):
-        data = self._init(desc)
-        table = data.table(type, version)
+        table = self._table(desc, type, version)
         try:
             result = table.keywords._generate_dict()
         finally:
-            table.close()
+            self._release(table)
             pass
         return result
 
     def version_table(self, desc, type, version):
-        data = self._init(desc)
-        table = data.table(type, version)
+        table = self._table(desc, type, version)
         try:
             result = table.version
         finally:
-            table.close()
+            self._release(table)
             pass
         return result
 
     def _getitem_table(self, desc, type, version, key):
-        data = self._init(desc)
-        table = data.table(type, version)
+        table = self._table(desc, type, version)
         try:
             result = table[key]._generate_dict()
         finally:
-            table.close()
+            self._release(table)
+            pass
+        return result
+
+    def _getrows_table(self, desc, type, version, start, count):
+        """Returns up to COUNT rows starting at row START as a list of
+        dictionaries."""
+        table = self._table(desc, type, version)
+        try:
+            result = []
+            for key in range(start, min(start + count, len(table))):
+                result.append(table[key]._generate_dict())
+                continue
+        finally:
+            self._release(table)
             pass
         return result
 
+    def _getcolumns_table(self, desc, type, version, start, count):
+        """Returns up to COUNT rows starting at row START as a
+        dictionary of columns."""
+        result = {}
+        for row in self._getrows_table(desc, type, version, start, count):
+            for key in row:
+                result.setdefault(key, []).append(row[key])
+                continue
+            continue
+        return result
+
     def _len_table(self, desc, type, version):
-        data = self._init(desc)
-        table = data.table(type, version)
+        table = self._table(desc, type, version)
         try:
             result = len(table)
         finally:
-            table.close()
+            self._release(table)
             pass
         return result
 
     def zap_table(self, desc, type, version):
         """Remove the specified version of the indicated table type."""
-        data = self._init(desc)
-        data.zap_table(type, version)
+        data = self._open(desc)
+        if type.startswith('AIPS '):
+            type = type[5:]
+            pass
+        _cache.discard(self._key(desc) + (type,))
+        try:
+            data.zap_table(type, version)
+        finally:
+            self._release(data)
+            pass
         return True                # Return something other than None.
 
     def _getitem_history(self, desc, key):
-        data = self._init(desc)
-        history = data.history
+        data = self._open(desc)
         try:
-            result = history[key]
+            history = data.history
+            try:
+                result = history[key]
+            finally:
+                history.close()
+                pass
         finally:
-            history.close()
+            self._release(data)
             pass
         return result
 
@@ -184,16 +522,31 @@ class AIPSUVData(AIPSData):
         return uvdata
 
     def antennas(self, desc):
-        uvdata = self._init(desc)
-        return uvdata.antennas
+        uvdata = self._open(desc)
+        try:
+            result = uvdata.antennas
+        finally:
+            self._release(uvdata)
+            pass
+        return result
 
     def polarizations(self, desc):
-        uvdata = self._init(desc)
-        return uvdata.polarizations
+        uvdata = self._open(desc)
+        try:
+            result = uvdata.polarizations
+        finally:
+            self._release(uvdata)
+            pass
+        return result
 
     def sources(self, desc):
-        uvdata = self._init(desc)
-        return uvdata.sources
+        uvdata = self._open(desc)
+        try:
+            result = uvdata.sources
+        finally:
+            self._release(uvdata)
+            pass
+        return result
 
     pass
 
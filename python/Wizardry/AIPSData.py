@@ -21,9 +21,17 @@ import AIPSDir, History, Image, UV, InfoList, Table, TableList
 
 # Global AIPS defaults.
 import AIPS
+from AIPSUtil import ehex
 
 # Generic Python stuff.
-import os
+import glob, hashlib, json, multiprocessing, os, shutil
+import tempfile, threading, warnings, zipfile
+from collections import OrderedDict
+from functools import reduce
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 # Select numarray or NumPy, fail gracefully if neither is available.
 try:
@@ -46,6 +54,14 @@ except ImportError:
     numpystatus = False
     pass
 
+# HDF5 support is optional.
+try:
+    import h5py
+    h5pystatus = True
+except ImportError:
+    h5pystatus = False
+    pass
+
 if numarraystatus and numpystatus:
     # Both numarray and NumPy are available.  Let the NUMERIX
     # environment variable decide which one we use.
@@ -65,6 +81,145 @@ def _array(sequence, shape):
         return numarray.array(sequence, type=numarray.Float32, shape=shape)
     pass
 
+# Default amount of memory used for the I/O buffer of a UV data set.
+_buffer_memory = 64 * 1024 * 1024
+
+# Default number of I/O buffer sized blocks of visibilities kept
+# around for random access.
+_cache_blocks = 16
+
+# Lock that serializes moving the Obit I/O buffers around, such that
+# cursors in different threads don't interfere with each other.
+_io_lock = threading.RLock()
+
+def _available_memory():
+    """Return the amount of available physical memory in bytes, or None
+    if it cannot be determined."""
+
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+    pass
+
+# Keyword arguments that select and calibrate visibilities while they
+# are being read, along with the name and type of the corresponding
+# Obit parameter.
+_calibration_options = {
+    'docalib': ('doCalib', int),
+    'gainuse': ('gainUse', int),
+    'flagver': ('flagVer', int),
+    'doband': ('doBand', int),
+    'bpver': ('BPVer', int),
+    'smooth': ('Smooth', float),
+    'dopol': ('doPol', int),
+    'bchan': ('BChan', int),
+    'echan': ('EChan', int),
+    'bif': ('BIF', int),
+    'eif': ('EIF', int),
+    'stokes': ('Stokes', str),
+    'timerang': ('timeRange', float),
+    'antennas': ('Antennas', int),
+    'sources': ('Sources', str),
+    'subarray': ('subA', int),
+    'freqid': ('FreqID', int),
+    }
+
+def _check_calibration_options(options, caller):
+    """Check that the keyword arguments in OPTIONS, which were passed
+    to the method named CALLER, select or calibrate visibilities."""
+
+    for key in options:
+        if not key in _calibration_options:
+            msg = "%s() got an unexpected keyword argument '%s'" \
+                  % (caller, key)
+            raise TypeError(msg)
+        continue
+    return
+
+def _uv_lrec(desc):
+    """Return the length of a visibility record described by DESC."""
+
+    lrec = 1
+    for len in desc['inaxes'][:desc['naxis']]:
+        lrec *= len
+        continue
+    return desc['nrparm'] + lrec
+
+def _nvispio(data):
+    """Return the number of visibilities that fit in the I/O buffer
+    of DATA.  This changes when the buffer is resized, so it should
+    not be cached."""
+
+    return InfoList.PGet(data.List, "nVisPIO")[4][0]
+
+def _close_quietly(data):
+    """Close the Obit object DATA after an error, without masking
+    that error."""
+
+    try:
+        data.Close(OErr.OErr())
+    except Exception:
+        pass
+    return
+
+def _baseline_code(ant1, ant2, subarray):
+    """Return a code that uniquely identifies the baseline between
+    antennas ANT1 and ANT2 in subarray SUBARRAY."""
+
+    if numpystatus:
+        ant1 = np.asarray(ant1, dtype=np.int64)
+        ant2 = np.asarray(ant2, dtype=np.int64)
+        subarray = np.asarray(subarray, dtype=np.int64)
+        pass
+    return (((ant1 << 12) + ant2) << 24) + subarray
+
+
+# Number of consecutive visibilities covered by an entry of the
+# baseline index.  For data in time order, this is a time bin.
+_index_chunk = 65536
+
+# Version of the format of the baseline index stored on disk.
+_index_version = 2
+
+def _index_entries(codes, chunks, first, last, tmin, tmax):
+    """Combine the baseline index entries that share a baseline CODE
+    and CHUNK, returning the entries sorted by baseline and chunk."""
+
+    if not len(codes):
+        return (codes, chunks, first, last, tmin, tmax)
+    order = np.lexsort((chunks, codes))
+    codes = codes[order]
+    chunks = chunks[order]
+    start = np.ones(len(codes), dtype=bool)
+    start[1:] = (codes[1:] != codes[:-1]) | (chunks[1:] != chunks[:-1])
+    starts = np.flatnonzero(start)
+    return (codes[starts], chunks[starts],
+            np.minimum.reduceat(first[order], starts),
+            np.maximum.reduceat(last[order], starts),
+            np.minimum.reduceat(tmin[order], starts),
+            np.maximum.reduceat(tmax[order], starts))
+
+def _uv_dtype(desc):
+    """Return a NumPy structured data type for the visibility records
+    described by DESC."""
+
+    names = []
+    formats = []
+    for ptype in desc['ptype']:
+        name = ptype.strip()
+        while name in names:
+            name += '_'
+            continue
+        names.append(name)
+        formats.append(np.float32)
+        continue
+    inaxes = desc['inaxes']
+    shape = (inaxes[3], inaxes[2], inaxes[1], inaxes[0])
+    names.append('visibility')
+    formats.append((np.float32, shape))
+    return np.dtype({'names': names, 'formats': formats})
+
 def _scalarize(value):
     """Scalarize a value.
 
@@ -303,11 +458,124 @@ class _AIPSTableKeywords:
     pass                                # class _AIPSTableKeywords
 
 
+class _AIPSTableIndex(object):
+    """This class is used as an index on the rows of an extension
+    table."""
+
+    def __init__(self, table, columns):
+        if isinstance(columns, str):
+            columns = [columns]
+            pass
+        self._table = table
+        self._columns = list(columns)
+        arrays = table.to_arrays(self._columns)
+        nrow = len(table)
+
+        keys = [self._values(arrays[key]) for key in self._columns]
+        self._rows = {}
+        for rownum in range(nrow):
+            key = tuple([values[rownum] for values in keys])
+            self._rows.setdefault(key, []).append(rownum)
+            continue
+
+        # Within each combination of the leading columns, sort the
+        # rows on the last column for range and nearest queries.
+        last = arrays[self._columns[-1]]
+        self._groups = {}
+        if last.ndim == 1:
+            groups = {}
+            for rownum in range(nrow):
+                key = tuple([values[rownum] for values in keys[:-1]])
+                groups.setdefault(key, []).append(rownum)
+                continue
+            for key in groups:
+                rownums = np.array(groups[key])
+                order = np.argsort(last[rownums], kind='mergesort')
+                self._groups[key] = (last[rownums][order], rownums[order])
+                continue
+            pass
+        return
+
+    def _values(self, array):
+        if array.ndim > 1:
+            return [tuple(value) for value in array.tolist()]
+        return array.tolist()
+
+    def _key(self, values, count):
+        if len(values) != count:
+            msg = 'Expected %d values, got %d' % (count, len(values))
+            raise TypeError(msg)
+        key = []
+        for value in values:
+            if isinstance(value, str):
+                value = _rstrip(value)
+            elif isinstance(value, (list, tuple)) or \
+                     (numpystatus and isinstance(value, np.ndarray)):
+                value = tuple(np.asarray(value).tolist())
+                pass
+            key.append(value)
+            continue
+        return tuple(key)
+
+    def _group(self, key):
+        if not key in self._groups:
+            if len(self._groups) == 0 and self._rows:
+                msg = "Column '%s' cannot be sorted" % self._columns[-1]
+                raise TypeError(msg)
+            raise KeyError(key)
+        return self._groups[key]
+
+    def lookup(self, *values):
+        """Return the rows whose indexed columns match VALUES."""
+
+        key = self._key(values, len(self._columns))
+        return [self._table[rownum] for rownum in self._rows.get(key, [])]
+
+    def range(self, *values):
+        """Return the rows for which the leading indexed columns
+        match VALUES and the last indexed column lies within the
+        (inclusive) range given by the last two of VALUES, sorted on
+        the last indexed column."""
+
+        key = self._key(values[:-2], len(self._columns) - 1)
+        if len(values) < 2:
+            msg = 'Expected %d values, got %d' % \
+                  (len(self._columns) + 1, len(values))
+            raise TypeError(msg)
+        try:
+            ordered, rownums = self._group(key)
+        except KeyError:
+            return []
+        start = np.searchsorted(ordered, values[-2], side='left')
+        stop = np.searchsorted(ordered, values[-1], side='right')
+        return [self._table[rownum] for rownum in rownums[start:stop]]
+
+    def nearest(self, *values):
+        """Return the row for which the leading indexed columns match
+        VALUES and the last indexed column is closest to the last of
+        VALUES."""
+
+        key = self._key(values[:-1], len(self._columns) - 1)
+        if len(values) < 1:
+            msg = 'Expected %d values, got 0' % len(self._columns)
+            raise TypeError(msg)
+        ordered, rownums = self._group(key)
+        value = values[-1]
+        i = np.searchsorted(ordered, value)
+        if i == len(ordered) or \
+               (i > 0 and value - ordered[i - 1] <= ordered[i] - value):
+            i -= 1
+            pass
+        return self._table[int(rownums[i])]
+
+    pass                                # class _AIPSTableIndex
+
+
 class _AIPSTable:
     """This class is used to access extension tables to an AIPS UV
-    data set."""
+    data set.  If READONLY is True, the table is opened read-only."""
 
-    def __init__(self, data, name, version):
+    def __init__(self, data, name, version, readonly=False):
         if not name.startswith('AIPS '):
             name = 'AIPS ' + name
             pass
@@ -326,8 +594,13 @@ class _AIPSTable:
             msg += ' does not exist'
             raise IOError(msg)
 
-        self._table = data.NewTable(3, name, version, self._err)
-        self._table.Open(3, self._err)
+        self._readonly = readonly
+        access = 3
+        if readonly:
+            access = 1
+            pass
+        self._table = data.NewTable(access, name, version, self._err)
+        self._table.Open(access, self._err)
         if self._err.isErr:
             raise self._err
         header = self._table.Desc.Dict
@@ -356,7 +629,9 @@ class _AIPSTable:
 
         assert(not self._err.isErr)
         # Reopen the file to make sure the keywords are updated.
-        self._table.Open(3, self._err)
+        if not self._readonly:
+            self._table.Open(3, self._err)
+            pass
         self._table.Close(self._err)
         if self._err.isErr:
             raise RuntimeError
@@ -405,6 +680,216 @@ class _AIPSTable:
         return _AIPSTableKeywords(self._table, self._err)
     keywords = property(_keywords)
 
+    def to_arrays(self, columns=None):
+        """Read columns of this extension table into arrays.
+
+        Returns a dictionary that maps the names of the columns listed
+        in COLUMNS, or of all columns if COLUMNS is not specified, to
+        arrays with one element per row.  Columns with a repeat count
+        larger than one are returned as two-dimensional arrays with
+        one row per row of the table.
+
+        Obit still reads the table one row at a time; this only
+        avoids creating a row object and looking up each field for
+        every row."""
+
+        if not numpystatus:
+            msg = 'NumPy not available'
+            raise NotImplementedError(msg)
+
+        if columns is None:
+            columns = self._keys
+            pass
+        fields = []
+        for key in columns:
+            if not key in self._columns:
+                msg = "%s instance has no column '%s'" % \
+                      (self.__class__.__name__, key)
+                raise KeyError(msg)
+            fields.append(self._columns[key])
+            continue
+
+        # Read the rows in one go, bypassing the row objects.
+        values = [[] for field in fields]
+        assert(not self._err.isErr)
+        for rownum in range(1, len(self) + 1):
+            row = self._table.ReadRow(rownum, self._err)
+            if self._err.isErr:
+                raise self._err
+            if not row:
+                msg = 'Cannot read row %d of %s table' % (rownum, self.name)
+                raise RuntimeError(msg)
+            for i in range(len(fields)):
+                values[i].append(row[fields[i]])
+                continue
+            continue
+
+        arrays = {}
+        for key, field, value in zip(columns, fields, values):
+            type, repeat, dtype = self._describe(field)
+            if type == 14:
+                arrays[key] = np.array([_rstrip(_scalarize(x)) for x in value],
+                                       dtype=str)
+                continue
+            array = np.array(value, dtype=dtype).reshape((len(value), repeat))
+            if repeat == 1:
+                array = array[:, 0]
+                pass
+            arrays[key] = array
+            continue
+        return arrays
+
+    def column(self, name):
+        """Read column NAME of this extension table into an array."""
+
+        return self.to_arrays([name])[name]
+
+    def index(self, columns):
+        """Build an index on this extension table.
+
+        COLUMNS is the name of a column or a sequence of column
+        names.  The returned index supports looking up rows that match
+        values for all these columns using lookup().  Within rows that
+        match the leading columns, range() returns the rows for which
+        the last column lies within a range and nearest() returns the
+        row for which it is closest to a value:
+
+        >>> index = cltable.index(['antenna_no', 'time'])
+        >>> row = index.nearest(3, 0.25)
+
+        The index is built in memory and does not reflect changes made
+        to the table afterwards."""
+
+        return _AIPSTableIndex(self, columns)
+
+    def _describe(self, field):
+        """Return the type, repeat count and NumPy type of FIELD."""
+
+        header = self._table.Desc.Dict
+        index = header['FieldName'].index(field)
+        type = header['type'][index]
+        if type == 10:
+            dtype = np.float32
+        elif type == 11:
+            dtype = np.float64
+        elif type == 14:
+            dtype = str
+        else:
+            dtype = np.int32
+            pass
+        return (type, header['repeat'][index], dtype)
+
+    def write_rows(self, start, arrays):
+        """Write rows to this extension table.
+
+        ARRAYS is a dictionary that maps column names to arrays with
+        one element, or one row of elements for columns with a repeat
+        count larger than one, per row.  The rows are written starting
+        at row START, which may extend the table.  Columns that are
+        not present in ARRAYS are left unchanged in existing rows and
+        set to zero in new rows.  All rows are written in a single
+        pass, and the number of rows and the keywords in the table
+        header are updated once at the end."""
+
+        if not numpystatus:
+            msg = 'NumPy not available'
+            raise NotImplementedError(msg)
+
+        nrow = len(self)
+        if start < 0:
+            start = nrow + start
+            pass
+        if start < 0 or start > nrow:
+            raise IndexError("list index out of range")
+
+        # Convert the arrays into lists of row values up front.
+        columns = {}
+        count = None
+        for key in arrays:
+            if not key in self._columns:
+                msg = "%s instance has no column '%s'" % \
+                      (self.__class__.__name__, key)
+                raise KeyError(msg)
+            field = self._columns[key]
+            type, repeat, dtype = self._describe(field)
+            if type == 14:
+                values = [str(value) for value in arrays[key]]
+            else:
+                values = np.asarray(arrays[key], dtype=dtype)
+                values = values.reshape((len(values), repeat)).tolist()
+                pass
+            if count is not None and len(values) != count:
+                msg = 'Columns have different lengths'
+                raise ValueError(msg)
+            count = len(values)
+            columns[field] = values
+            continue
+        if not count:
+            return
+
+        # Build all rows first, reading the existing rows that are
+        # only partially overwritten.
+        template = AIPSTableRow(self)._row
+        rows = []
+        assert(not self._err.isErr)
+        for i in range(count):
+            rownum = start + i + 1
+            if rownum <= nrow and len(columns) < len(self._columns):
+                row = self._table.ReadRow(rownum, self._err)
+                if self._err.isErr:
+                    raise RuntimeError
+                if not row:
+                    msg = 'Cannot read row %d of %s table' % \
+                          (rownum, self.name)
+                    raise RuntimeError(msg)
+            else:
+                row = dict(template)
+                pass
+            for field in columns:
+                row[field] = columns[field][i]
+                continue
+            rows.append(row)
+            continue
+        self._write(start, rows)
+        return
+
+    def extend(self, rows):
+        """Append rows to this extension table.
+
+        ROWS is either a dictionary that maps column names to arrays,
+        as accepted by write_rows(), or a sequence of rows.  All rows
+        are written in a single pass, and the table header is updated
+        once at the end."""
+
+        if isinstance(rows, dict):
+            self.write_rows(len(self), rows)
+            return
+        self._write(len(self), [row._row for row in rows])
+        return
+
+    def _write(self, start, rows):
+        """Write the Obit rows in ROWS starting after row START, and
+        update the table header once all rows have been written."""
+
+        assert(not self._err.isErr)
+        rownum = start
+        for row in rows:
+            rownum += 1
+            self._table.WriteRow(rownum, row, self._err)
+            if self._err.isErr:
+                raise RuntimeError
+            continue
+        if not rows:
+            return
+
+        # Closing the table flushes the rows and writes the number of
+        # rows and the keywords to the header.
+        self._table.Close(self._err)
+        self._table.Open(3, self._err)
+        if self._err.isErr:
+            raise RuntimeError
+        return
+
     pass                                # class _AIPSTable
 
 
@@ -485,13 +970,21 @@ class _AIPSVisibility(object):
         self._first = 0
         self._count = 0
         self._flush = False
+        self._cursor = None
+        if numpystatus:
+            # Use a private copy of the I/O buffer, such that other
+            # visibilities and iterators don't get in the way.
+            self._cursor = _AIPSVisibilityBuffer(data, err)
+            if index > -1:
+                self._fill(index)
+                pass
+            return
         if index > -1:
             shape = len(self._data.VisBuf) // 4
             self._buffer = _array(self._data.VisBuf, shape)
             self._first = self._data.Desc.Dict['firstVis'] - 1
             self._count = self._data.Desc.Dict['numVisBuff']
-            count = InfoList.PGet(self._data.List, "nVisPIO")[4][0]
-            self._buffer.shape = (count, -1)
+            self._buffer.shape = (_nvispio(self._data), -1)
 
             if self._first < 0 or \
                     index < self._first or index >= self._first + self._count:
@@ -502,7 +995,32 @@ class _AIPSVisibility(object):
             pass
         return
 
+    def _writeback(self):
+        if self._cursor:
+            self._cursor.store(self._first, self._buffer[:self._count])
+        else:
+            assert(self._first == self._data.Desc.Dict['firstVis'] - 1)
+            Obit.UVRewrite(self._data.me, self._err.me)
+            if self._err.isErr:
+                raise RuntimeError
+            pass
+        self._flush = False
+        return
+
     def _fill(self, index=None):
+        if self._cursor:
+            if self._flush:
+                self._writeback()
+                pass
+            if index is None:
+                index = self._first + self._count
+                pass
+            self._cursor.read(index)
+            self._buffer = self._cursor.buffer
+            self._first = self._cursor.first
+            self._count = self._cursor.count
+            self._index = index - self._first
+            return
         if self._flush:
             assert(self._first == self._data.Desc.Dict['firstVis'] - 1)
             Obit.UVRewrite(self._data.me, self._err.me)
@@ -512,8 +1030,7 @@ class _AIPSVisibility(object):
             pass
         if index:
             d = self._data.IODesc.Dict
-            count = InfoList.PGet(self._data.List, "nVisPIO")[4][0]
-            d['firstVis'] = max(0, index - count + 1)
+            d['firstVis'] = max(0, index - _nvispio(self._data) + 1)
             self._data.IODesc.Dict = d
             pass
         Obit.UVRead(self._data.me, self._err.me)
@@ -523,8 +1040,7 @@ class _AIPSVisibility(object):
         self._buffer = _array(self._data.VisBuf, shape)
         self._first = self._data.Desc.Dict['firstVis'] - 1
         self._count = self._data.Desc.Dict['numVisBuff']
-        count = InfoList.PGet(self._data.List, "nVisPIO")[4][0]
-        self._buffer.shape = (count, -1)
+        self._buffer.shape = (_nvispio(self._data), -1)
         self._index = 0
         return
 
@@ -644,7 +1160,7 @@ class _AIPSVisibility(object):
 
 class _AIPSVisibilityIter(_AIPSVisibility):
     def __init__(self, data, err, ranges = []):
-        if data.Desc.Dict['firstVis'] > 0:
+        if not numpystatus and data.Desc.Dict['firstVis'] > 0:
             data.Open(3, err)
 
         _AIPSVisibility.__init__(self, data, err, -1)
@@ -656,6 +1172,9 @@ class _AIPSVisibilityIter(_AIPSVisibility):
         self._range = self._ranges.pop(0)
         return
 
+    def __iter__(self):
+        return self
+
     def __next__(self):
         self._index += 1
         if self._index + self._first > self._range[1]:
@@ -664,8 +1183,10 @@ class _AIPSVisibilityIter(_AIPSVisibility):
             except:
                 pass
 
-        while self._first + self._count < self._range[0]:
-            self._fill()
+        if self._first + self._count < self._range[0] and \
+                self._range[0] < self._range[1]:
+            # Skip straight to the start of the range.
+            self._fill(self._range[0])
             pass
 
         if self._index + self._first < self._range[0]:
@@ -673,7 +1194,9 @@ class _AIPSVisibilityIter(_AIPSVisibility):
             pass
             
         if self._index + self._first >= self._range[1]:
-            if self._flush:
+            if self._flush and self._cursor:
+                self._writeback()
+            elif self._flush:
                 Obit.UVWrite(self._data.me, self._err.me)
                 if self._err.isErr:
                     raise RuntimeError
@@ -707,8 +1230,9 @@ class _AIPSVisibilitySel(object):
         return
 
     def __iter__(self):
+        self._data._sync_cache()
         return _AIPSVisibilityIter(self._data._data, self._data._err,
-                                   self._ranges)
+                                   list(self._ranges))
 
     pass
 
@@ -719,123 +1243,1956 @@ class _AIPSVisibilitySlice(object):
 
         start = 0
         stop = len(data)
-        if slice.start:
+        if slice.start is not None:
             if slice.start < 0:
                 start = len(data) + slice.start
             else:
                 start = slice.start
                 pass
             pass
-        if slice.stop:
+        if slice.stop is not None:
             if slice.stop < 0:
                 stop = len(data) + slice.stop
             else:
                 stop = slice.stop
                 pass
             pass
-        if slice.step and not slice.step == 1:
-            msg = 'Stride %d is not supported' % slice.step
-            raise NotimplementedError(msg)
+        # Slices with a stride are handled by _AIPSVisibilityIndex.
         self._ranges = [(start, stop)]
         return
 
     def __iter__(self):
+        self._data._sync_cache()
         return _AIPSVisibilityIter(self._data._data, self._data._err,
-                                   self._ranges)
+                                   list(self._ranges))
+
+    def iter_blocks(self, nvis=None):
+        """Iterate over the selected visibilities in blocks."""
+
+        self._data._sync_cache()
+        return _AIPSVisibilityBlockIter(self._data._data, self._data._err,
+                                        nvis, list(self._ranges))
 
     pass
 
 
-class _AIPSDataKeywords:
-    def __init__(self, data, obit, err):
-        self._err = err
+class _AIPSVisibilityIndex(object):
+    """This class is used to access an arbitrary selection of
+    visibilities, specified by a stride, an array of indices or a
+    boolean mask."""
+
+    def __init__(self, data, indices):
+        if not numpystatus:
+            msg = 'NumPy not available'
+            raise NotImplementedError(msg)
+
         self._data = data
-        self._obit = obit
+
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            if indices.shape != (len(data),):
+                msg = 'Boolean mask does not match the number of visibilities'
+                raise IndexError(msg)
+            indices = np.nonzero(indices)[0]
+            pass
+        indices = indices.astype(np.int64).ravel()
+        indices[indices < 0] += len(data)
+        if len(indices) and (indices.min() < 0 or
+                             indices.max() >= len(data)):
+            raise IndexError("list index out of range")
+        self._indices = indices
         return
 
-    def __getitem__(self, key):
-        key = key.upper().ljust(8)
-        value = InfoList.PGet(self._data.Desc.List, key)
-        return _scalarize(value[4])
+    def __len__(self):
+        return len(self._indices)
 
-    def __setitem__(self, key, value):
-        key = key.upper().ljust(8)
-        try:
-            _type = InfoList.PGet(self._data.Desc.List, key)[2]
-        except:
-            # New keys are either strings or floats.
-            if type(value) == str:
-                _type = 14
-            else:
-                _type = 10
-                pass
+    def __iter__(self):
+        return _AIPSVisibilityIndexIter(self._data, self._indices)
+
+    def iter_blocks(self, nvis=None):
+        """Iterate over the selected visibilities in blocks.
+
+        Each block holds up to NVIS of the selected visibilities, in
+        the order in which they were selected.  The 'indices' attribute
+        of a block holds the numbers of its visibilities."""
+
+        self._data._sync_cache()
+        buffer = _AIPSVisibilityBuffer(self._data._data, self._data._err)
+        desc = self._data._data.Desc.Dict
+        if not nvis:
+            nvis = buffer.nvispio
             pass
-        if _type in (2, 3, 4):
-            value = int(value)
-            InfoList.PAlwaysPutInt(self._data.Desc.List, key,
-                                   [1, 1, 1, 1, 1], _vectorize(value))
-        elif _type == 10:
-            value = float(value)
-            InfoList.PAlwaysPutFloat(self._data.Desc.List, key,
-                                     [1, 1, 1, 1, 1], _vectorize(value))
-        elif _type == 11:
-            value = float(value)
-            InfoList.PAlwaysPutDouble(self._data.Desc.List, key,
-                                      [1, 1, 1, 1, 1], _vectorize(value))
-        elif _type == 14:
-            value = str(value).ljust(8)
-            InfoList.PAlwaysPutString(self._data.Desc.List, key,
-                                      [8, 1, 1, 1, 1], _vectorize(value))
-        elif _type == 15:
-            value = bool(value)
-            InfoList.PAlwaysPutBoolean(self._table.Desc.List, key,
-                                      [1, 1, 1, 1, 1], _vectorize(value))
-        else:
-            raise AssertionError("not implemented")
-        self._obit.PDirty(self._data)
+        for pos in range(0, len(self._indices), nvis):
+            indices = self._indices[pos:pos + nvis]
+            records = None
+
+            # Only copy the records we need out of each I/O buffer.
+            blocknos = indices // buffer.nvispio
+            for blockno in np.unique(blocknos):
+                mask = (blocknos == blockno)
+                first = indices[mask].min()
+                count = indices[mask].max() - first + 1
+                block = buffer.fetch(first, count)
+                if records is None:
+                    records = np.empty((len(indices), block.shape[1]),
+                                       dtype=np.float32)
+                    pass
+                records[mask] = block[indices[mask] - first]
+                continue
+
+            block = _AIPSVisibilityBlock(desc, records, indices[0])
+            block.indices = indices
+            yield block
+            continue
         return
 
-    def _generate_dict(self):
-        dict = {}
-        for key in self._data.Desc.List.Dict:
-            if self._data.Desc.List.Dict[key][0] == 13:
-                dict[key] = self._data.Desc.List.Dict[key][2][0]
-            else:
-                dict[key] = _scalarize(self._data.Desc.List.Dict[key][2])
+    pass                                # class _AIPSVisibilityIndex
+
+
+class _AIPSVisibilitySelectionIter(object):
+    """This class is used to iterate over the visibilities within
+    RANGES that are on one of the baselines in CODES, if specified,
+    and within TIMERANGE, if specified."""
+
+    def __init__(self, data, err, ranges, codes, timerange):
+        self._data = data
+        self._err = err
+        self._ranges = list(ranges)
+        self._codes = codes
+        self._timerange = timerange
+        self._iter = None
+        return
+
+    def __iter__(self):
+        return self
+
+    def _match(self, vis):
+        if self._timerange:
+            if not self._timerange[0] <= vis.time <= self._timerange[1]:
+                return False
+            pass
+        if self._codes is not None:
+            ant1, ant2 = vis.baseline
+            code = int(_baseline_code(ant1, ant2, vis.subarray))
+            return code in self._codes
+        return True
+
+    def __next__(self):
+        while True:
+            if self._iter is None:
+                if not self._ranges:
+                    raise StopIteration
+                # Iterate over the ranges one at a time.
+                self._iter = _AIPSVisibilityIter(self._data, self._err,
+                                                 [self._ranges.pop(0)])
                 pass
+            try:
+                vis = next(self._iter)
+            except StopIteration:
+                self._iter = None
+                continue
+            if self._match(vis):
+                return vis
             continue
-        return dict
+        pass
 
-    def __str__(self):
-        return str(self._generate_dict())
+    next = __next__                     # for Python 2
 
-    def update(self):
-        self._obit.PUpdateDesc(self._data, self._err)
-        pass
+    pass                                # class _AIPSVisibilitySelectionIter
 
-    pass                                # class _AIPSDataKeywords
 
+class _AIPSVisibilitySelection(object):
+    """This class is used to access the visibilities selected by
+    baseline and time range.
 
-class _AIPSDataHeader(object):
-    def __init__(self, data, obit, err):
-        self._err = err
+    Only the visibilities within RANGES are read, and those are
+    filtered while iterating, such that the data is read only once.
+    CODES holds the codes of the selected baselines, or is None to
+    select all baselines, and TIMERANGE is a pair of times in days, or
+    None to select all times."""
+
+    def __init__(self, data, ranges, codes, timerange):
         self._data = data
-        self._obit = obit
-        self._dict = data.Desc.Dict
-        for key in self._strip:
-            if self._keys[key] in self._dict:
-                value = _rstrip(self._dict[self._keys[key]])
-                self._dict[self._keys[key]] = value
-                pass
-            continue
+        self._ranges = ranges
+        self._codes = codes
+        self._timerange = timerange
         return
 
-    _keys = {'object': 'object',
-             'telescop': 'teles',
-             'instrume': 'instrume',
-             'observer': 'observer',
-             'date_obs': 'obsdat',
-             'date_map': 'date',
+    def __len__(self):
+        # This takes a pass over the selected ranges.
+        count = 0
+        for block in self.iter_blocks():
+            count += len(block)
+            continue
+        return count
+
+    def __iter__(self):
+        self._data._sync_cache()
+        codes = self._codes
+        if codes is not None:
+            codes = set(codes.tolist())
+            pass
+        return _AIPSVisibilitySelectionIter(self._data._data,
+                                            self._data._err,
+                                            list(self._ranges), codes,
+                                            self._timerange)
+
+    def _mask(self, block):
+        mask = np.ones(len(block), dtype=bool)
+        if self._codes is not None:
+            code = _baseline_code(block.ant1, block.ant2, block.subarray)
+            mask &= np.isin(code, self._codes)
+            pass
+        if self._timerange:
+            time = block.time.astype(np.float64)
+            mask &= (time >= self._timerange[0]) & \
+                    (time <= self._timerange[1])
+            pass
+        return mask
+
+    def iter_blocks(self, nvis=None):
+        """Iterate over the selected visibilities in blocks.
+
+        Each block holds the selected visibilities out of up to NVIS
+        consecutive visibilities.  The 'indices' attribute of a block
+        holds the numbers of its visibilities."""
+
+        self._data._sync_cache()
+        buffer = _AIPSVisibilityBuffer(self._data._data, self._data._err)
+        desc = self._data._data.Desc.Dict
+        if not nvis:
+            nvis = buffer.nvispio
+            pass
+        for first, last in self._ranges:
+            for pos in range(first, last, nvis):
+                records = buffer.fetch(pos, min(nvis, last - pos))
+                mask = self._mask(_AIPSVisibilityBlock(desc, records, pos))
+                if not mask.any():
+                    continue
+                indices = pos + np.flatnonzero(mask)
+                block = _AIPSVisibilityBlock(desc, records[mask], indices[0])
+                block.indices = indices
+                yield block
+                continue
+            continue
+        return
+
+    pass                                # class _AIPSVisibilitySelection
+
+
+class _AIPSVisibilityBuffer(object):
+    """This class is used to move the Obit I/O buffer of a UV data set
+    around and to copy visibilities out of it.
+
+    Each instance keeps its own copy of the visibilities it last read
+    and positions the Obit I/O buffer explicitly for every read and
+    write, so any number of instances can be used on the same data
+    set at the same time."""
+
+    def __init__(self, data, err):
+        # Give an early warning we're not going to succeed.
+        if not numpystatus:
+            msg = 'NumPy not available'
+            raise NotImplementedError(msg)
+
+        self._err = err
+        self._data = data
+        self.first = -1
+        self.count = 0
+        self.buffer = None
+        return
+
+    def _get_nvispio(self):
+        return _nvispio(self._data)
+    nvispio = property(_get_nvispio,
+                       doc='Number of visibilities per I/O buffer.')
+
+    def _view(self):
+        # Derive the shape from the current buffer, since it may have
+        # been resized since this instance was created.
+        shape = len(self._data.VisBuf) // 4
+        view = _array(self._data.VisBuf, shape)
+        view.shape = (_nvispio(self._data), -1)
+        return view
+
+    def read(self, start):
+        """Fill the buffer such that it contains visibility START."""
+
+        with _io_lock:
+            # Obit starts reading the next buffer right after the
+            # previous one, unless the first visibility was reset.
+            d = self._data.IODesc.Dict
+            d['firstVis'] = max(0, start + 1 - d['numVisBuff'])
+            self._data.IODesc.Dict = d
+            Obit.UVRead(self._data.me, self._err.me)
+            if self._err.isErr:
+                raise RuntimeError
+            first = self._data.Desc.Dict['firstVis'] - 1
+            count = self._data.Desc.Dict['numVisBuff']
+            if start < first or start >= first + count:
+                msg = 'Cannot position I/O buffer at visibility %d' % start
+                raise RuntimeError(msg)
+            self.buffer = self._view()[:count].copy()
+            self.first = first
+            self.count = count
+            pass
+        return
+
+    def fetch(self, start, count):
+        """Return a copy of COUNT visibility records starting at
+        visibility START."""
+
+        records = None
+        pos = start
+        while pos < start + count:
+            if pos < self.first or pos >= self.first + self.count:
+                self.read(pos)
+                pass
+            if records is None:
+                records = np.empty((count, self.buffer.shape[1]),
+                                   dtype=np.float32)
+                pass
+            num = min(start + count, self.first + self.count) - pos
+            records[pos - start:pos - start + num] = \
+                self.buffer[pos - self.first:pos - self.first + num]
+            pos += num
+            continue
+        return records
+
+    def store(self, start, records):
+        """Write visibility records RECORDS back to the data set,
+        starting at visibility START."""
+
+        pos = start
+        while pos < start + len(records):
+            with _io_lock:
+                # Reread the buffer, since it may have been moved or
+                # modified through another instance.
+                self.read(pos)
+                num = min(start + len(records), self.first + self.count) - pos
+                self.buffer[pos - self.first:pos - self.first + num] = \
+                    records[pos - start:pos - start + num]
+                self._view()[:self.count] = self.buffer
+                Obit.UVRewrite(self._data.me, self._err.me)
+                if self._err.isErr:
+                    raise RuntimeError
+                pass
+            pos += num
+            continue
+        return
+
+    pass                                # class _AIPSVisibilityBuffer
+
+
+class _AIPSVisibilityCache(object):
+    """This class is used to keep a bounded number of blocks of
+    visibilities around for random access.
+
+    Blocks are aligned on I/O buffer boundaries and the least recently
+    used block is dropped when the cache is full.  Modified blocks are
+    written back when they are dropped or when the cache is
+    flushed."""
+
+    def __init__(self, data, err, nblocks):
+        self._buffer = _AIPSVisibilityBuffer(data, err)
+        self._nvis = int(data.Desc.Dict['nvis'])
+        self._nblocks = max(1, nblocks)
+        # Keep the block size fixed, even if the I/O buffer is resized.
+        self.nvispio = self._buffer.nvispio
+        self._blocks = OrderedDict()
+        self._dirty = set()
+        return
+
+    def block(self, index):
+        """Return the first visibility and the records of the block
+        that contains visibility INDEX."""
+
+        nvispio = self.nvispio
+        blockno = index // nvispio
+        with _io_lock:
+            if blockno in self._blocks:
+                # Move the block to the end of the queue.
+                records = self._blocks.pop(blockno)
+                self._blocks[blockno] = records
+            else:
+                first = blockno * nvispio
+                count = min(nvispio, self._nvis - first)
+                records = self._buffer.fetch(first, count)
+                self._blocks[blockno] = records
+                while len(self._blocks) > self._nblocks:
+                    self._drop()
+                    continue
+                pass
+            pass
+        return (blockno * nvispio, records)
+
+    def _drop(self):
+        blockno, records = self._blocks.popitem(last=False)
+        if blockno in self._dirty:
+            self._buffer.store(blockno * self.nvispio, records)
+            self._dirty.discard(blockno)
+            pass
+        return
+
+    def store(self, index, record):
+        """Store RECORD as visibility INDEX."""
+
+        with _io_lock:
+            first, records = self.block(index)
+            records[index - first] = record
+            self._dirty.add(index // self.nvispio)
+            pass
+        return
+
+    def flush(self):
+        """Write back all modified blocks."""
+
+        with _io_lock:
+            for blockno in sorted(self._dirty):
+                records = self._blocks[blockno]
+                self._buffer.store(blockno * self.nvispio, records)
+                continue
+            self._dirty.clear()
+            pass
+        return
+
+    pass                                # class _AIPSVisibilityCache
+
+
+class _AIPSCachedVisibility(_AIPSVisibility):
+    """This class is used to access a single visibility through the
+    cache."""
+
+    def __init__(self, uvdata, index):
+        _AIPSVisibility.__init__(self, uvdata._data, uvdata._err, -1)
+        self._uvdata = uvdata
+        if index > -1:
+            self._seek(index)
+            pass
+        return
+
+    def _seek(self, index):
+        if index < self._first or index >= self._first + self._count:
+            cache = self._uvdata._visibility_cache()
+            self._first, self._buffer = cache.block(index)
+            self._count = len(self._buffer)
+            pass
+        self._index = index - self._first
+        return
+
+    def update(self):
+        cache = self._uvdata._visibility_cache()
+        cache.store(self._first + self._index, self._buffer[self._index])
+        return
+
+    pass                                # class _AIPSCachedVisibility
+
+
+class _AIPSVisibilityIndexIter(_AIPSCachedVisibility):
+    def __init__(self, uvdata, indices):
+        _AIPSCachedVisibility.__init__(self, uvdata, -1)
+        self._indices = indices
+        self._pos = -1
+        return
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self._pos += 1
+        if self._pos >= len(self._indices):
+            raise StopIteration
+        self._seek(int(self._indices[self._pos]))
+        return self
+
+    next = __next__                     # for Python 2
+
+    pass                                # class _AIPSVisibilityIndexIter
+
+
+class _AIPSVisibilityBlock(object):
+    """This class is used to access a block of visibilities as arrays.
+
+    Random parameters are presented as one-dimensional arrays with one
+    element per visibility.  The visibilities themselves are presented
+    as an array with shape (count, nif, nchan, nstokes, 3)."""
+
+    def __init__(self, desc, records, first):
+        self._desc = desc
+        self._records = records
+        self.first = first
+        self.indices = None
+        self.flags = None
+        self._ant1 = None
+        self._ant2 = None
+        self._subarray = None
+        if self._desc['ilocb'] == -1:
+            try:
+                self._ant1 = self._desc['ptype'].index('ANTENNA1')
+                self._ant2 = self._desc['ptype'].index('ANTENNA2')
+                self._subarray = self._desc['ptype'].index('SUBARRAY')
+            except:
+                pass
+            pass
+        return
+
+    def __len__(self):
+        return len(self._records)
+
+    # Fields that can be assigned to as a whole.
+    _fields = ('u', 'v', 'w', 'time', 'source', 'freqsel', 'inttim',
+               'corrid', 'ant1', 'ant2', 'subarray', 'visibility')
+
+    def _column(self, key):
+        rnd_indx = self._desc[key]
+        if rnd_indx == -1:
+            raise KeyError('Random Parameter not present')
+        return self._records[:, rnd_indx]
+
+    def _set_column(self, key, value):
+        rnd_indx = self._desc[key]
+        if rnd_indx == -1:
+            raise KeyError('Random Parameter not present')
+        self._records[:, rnd_indx] = value
+        return
+
+    def _property(key):
+        return property(lambda self: self._column(key),
+                        lambda self, value: self._set_column(key, value))
+
+    u = _property('ilocu')
+    v = _property('ilocv')
+    w = _property('ilocw')
+    time = _property('iloct')
+    source = _property('ilocsu')
+    freqsel = _property('ilocfq')
+    inttim = _property('ilocit')
+    corrid = _property('ilocid')
+    del _property
+
+    def _set_baseline(self, ant1, ant2, subarray):
+        baseline = ant1 * 256 + ant2 + (subarray - 1) * 0.01
+        self._set_column('ilocb', baseline)
+        return
+
+    def _get_ant1(self):
+        if self._ant1 and self._ant2:
+            return self._records[:, self._ant1].astype(np.int32)
+        baseline = self._column('ilocb').astype(np.int32)
+        return baseline // 256
+    def _set_ant1(self, value):
+        if self._ant1 and self._ant2:
+            self._records[:, self._ant1] = value
+            return
+        self._set_baseline(value, self.ant2, self.subarray)
+        return
+    ant1 = property(_get_ant1, _set_ant1)
+
+    def _get_ant2(self):
+        if self._ant1 and self._ant2:
+            return self._records[:, self._ant2].astype(np.int32)
+        baseline = self._column('ilocb').astype(np.int32)
+        return baseline % 256
+    def _set_ant2(self, value):
+        if self._ant1 and self._ant2:
+            self._records[:, self._ant2] = value
+            return
+        self._set_baseline(self.ant1, value, self.subarray)
+        return
+    ant2 = property(_get_ant2, _set_ant2)
+
+    def _get_subarray(self):
+        if self._subarray:
+            return self._records[:, self._subarray].astype(np.int32)
+        ilocb = self._column('ilocb')
+        fraction = ilocb - ilocb.astype(np.int32)
+        return (fraction * 100 + 0.5).astype(np.int32) + 1
+    def _set_subarray(self, value):
+        if self._subarray:
+            self._records[:, self._subarray] = value
+            return
+        self._set_baseline(self.ant1, self.ant2, value)
+        return
+    subarray = property(_get_subarray, _set_subarray)
+
+    def _get_visibility(self):
+        visibility = self._records[:, self._desc['nrparm']:]
+        inaxes = self._desc['inaxes']
+        shape = (len(self), inaxes[3], inaxes[2], inaxes[1], inaxes[0])
+        return visibility.reshape(shape)
+    def _set_visibility(self, value):
+        value = np.asarray(value, dtype=np.float32)
+        self._records[:, self._desc['nrparm']:] = \
+            value.reshape((len(self), -1))
+        return
+    visibility = property(_get_visibility, _set_visibility)
+
+    def _get_masked_visibility(self):
+        visibility = self.visibility
+        if self.flags is None:
+            return np.ma.masked_array(visibility)
+        mask = np.repeat(self.flags[..., np.newaxis],
+                         visibility.shape[-1], axis=-1)
+        return np.ma.masked_array(visibility, mask=mask)
+    masked_visibility = property(_get_masked_visibility)
+
+    def _assign(self, arrays):
+        """Assign the arrays in dictionary ARRAYS to the fields of this
+        block."""
+
+        for name in arrays:
+            if not name in self._fields:
+                msg = "%s instance has no field '%s'" % \
+                      (self.__class__.__name__, name)
+                raise KeyError(msg)
+            setattr(self, name, arrays[name])
+            continue
+        return
+
+    pass                                # class _AIPSVisibilityBlock
+
+
+class _AIPSVisibilityBlockIter(object):
+    """This class is used to iterate over blocks of visibilities.
+
+    If the iteration is writable, each block is written back when the
+    next block is requested or when the iterator is closed.  Closing
+    happens when the iterator is used as a context manager, and as a
+    last resort when it is garbage collected."""
+
+    def __init__(self, data, err, nvis, ranges, writable=False):
+        self._buffer = _AIPSVisibilityBuffer(data, err)
+        self._desc = data.Desc.Dict
+        self._nvis = nvis
+        if not self._nvis:
+            self._nvis = self._buffer.nvispio
+            pass
+        self._ranges = ranges
+        self._pos = self._ranges[0][0]
+        self._writable = writable
+        self._block = None
+        self.flags = None
+        return
+
+    def __iter__(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+        return False
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+        return
+
+    def close(self):
+        """Write back the current block, if needed, and end the
+        iteration."""
+
+        self._flush()
+        self._ranges = []
+        return
+
+    def _make_block(self, records, first):
+        block = _AIPSVisibilityBlock(self._desc, records, first)
+        if self.flags:
+            block.flags = self.flags.mask(block)
+            pass
+        return block
+
+    def _flush(self):
+        if self._writable and self._block:
+            self._buffer.store(self._block.first, self._block._records)
+            pass
+        self._block = None
+        return
+
+    def _next_range(self):
+        """Return the first visibility and the number of visibilities
+        of the next block, or None if there are no more blocks."""
+
+        while self._ranges and self._pos >= self._ranges[0][1]:
+            self._ranges.pop(0)
+            if self._ranges:
+                self._pos = self._ranges[0][0]
+                pass
+            continue
+        if not self._ranges:
+            return None
+        first = self._pos
+        count = min(self._nvis, self._ranges[0][1] - first)
+        self._pos += count
+        return (first, count)
+
+    def __next__(self):
+        self._flush()
+        next_range = self._next_range()
+        if not next_range:
+            raise StopIteration
+        first, count = next_range
+        records = self._buffer.fetch(first, count)
+        self._block = self._make_block(records, first)
+        return self._block
+
+    next = __next__                     # for Python 2
+
+    pass                                # class _AIPSVisibilityBlockIter
+
+
+def _prefetch_worker(buffer, requests, results):
+    """Handle the fetch and store requests of a prefetching iterator
+    until a None request is received.
+
+    This is a function rather than a method, such that the thread
+    doesn't keep the iterator alive."""
+
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        try:
+            if request[0] == 'fetch':
+                result = buffer.fetch(request[1], request[2])
+                results.put((True, result))
+            else:
+                buffer.store(request[1], request[2])
+                pass
+        except Exception as exception:
+            results.put((False, exception))
+            pass
+        continue
+    return
+
+
+class _AIPSVisibilityPrefetchIter(_AIPSVisibilityBlockIter):
+    """This class is used to iterate over blocks of visibilities while
+    a background thread reads the next block.
+
+    All access to the Obit data object is done by the background
+    thread, in the order in which it was requested.  The next block
+    is requested as soon as a block is handed out, so a block is
+    written back after the following block has been read.  Since
+    blocks never overlap, this doesn't change the outcome.  Closing
+    the iterator writes back the last block and stops the thread."""
+
+    def __init__(self, data, err, nvis, ranges, writable=False, uvfile=None):
+        _AIPSVisibilityBlockIter.__init__(self, data, err, nvis, ranges,
+                                          writable)
+        self._lrec = _uv_lrec(data.IODesc.Dict)
+        self._uvfile = None
+        if uvfile and hasattr(os, 'posix_fadvise'):
+            self._uvfile = open(uvfile, 'rb')
+            pass
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._thread = threading.Thread(target=_prefetch_worker,
+                                        args=(self._buffer, self._requests,
+                                              self._results))
+        self._thread.daemon = True
+        self._thread.start()
+        self._pending = self._prefetch()
+        return
+
+    def _prefetch(self):
+        next_range = self._next_range()
+        if not next_range:
+            return None
+        if self._uvfile:
+            # Let the operating system start reading as well.
+            size = 4 * self._lrec
+            os.posix_fadvise(self._uvfile.fileno(), next_range[0] * size,
+                             next_range[1] * size, os.POSIX_FADV_WILLNEED)
+            pass
+        self._requests.put(('fetch',) + next_range)
+        return next_range
+
+    def _flush(self):
+        if self._writable and self._block:
+            self._requests.put(('store', self._block.first,
+                                self._block._records))
+            pass
+        self._block = None
+        return
+
+    def close(self):
+        """Write back the current block, if needed, end the iteration
+        and stop the background thread."""
+
+        self._flush()
+        self._ranges = []
+        self._pending = None
+        self._stop()
+        return
+
+    def _stop(self):
+        if self._thread:
+            self._requests.put(None)
+            self._thread.join()
+            self._thread = None
+            pass
+        if self._uvfile:
+            self._uvfile.close()
+            self._uvfile = None
+            pass
+        # Report any failure to write back the last block.
+        while not self._results.empty():
+            success, result = self._results.get()
+            if not success:
+                raise result
+            continue
+        return
+
+    def __next__(self):
+        self._flush()
+        if not self._pending:
+            self._stop()
+            raise StopIteration
+        first, count = self._pending
+        success, result = self._results.get()
+        if not success:
+            self._stop()
+            raise result
+        self._pending = self._prefetch()
+        self._block = self._make_block(result, first)
+        return self._block
+
+    next = __next__                     # for Python 2
+
+    pass                                # class _AIPSVisibilityPrefetchIter
+
+
+class _AIPSCalibratedBlockIter(object):
+    """This class is used to iterate over blocks of visibilities that
+    are selected and calibrated by Obit while they are being read.
+
+    Selection changes the number of visibilities and their layout, so
+    the 'first' attribute of a block counts the visibilities that
+    passed the selection, and blocks cannot be written back.
+
+    The data set is closed when the iteration ends.  Use the iterator
+    as a context manager, or call close(), to close it when leaving
+    the iteration early."""
+
+    def __init__(self, data, err, nvis):
+        self._data = data
+        self._err = err
+        self._desc = data.Desc.Dict
+        self._lrec = _uv_lrec(self._desc)
+        self._nvis = nvis
+        if not self._nvis:
+            self._nvis = InfoList.PGet(data.List, "nVisPIO")[4][0]
+            pass
+        self._records = []
+        self._count = 0
+        self._pos = 0
+        self._eof = False
+        return
+
+    def __iter__(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+        return False
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+        return
+
+    def close(self):
+        """Close the data set and end the iteration."""
+
+        self._records = []
+        self._count = 0
+        if not self._eof:
+            self._eof = True
+            self._data.Close(self._err)
+            pass
+        return
+
+    def _read(self):
+        Obit.UVRead(self._data.me, self._err.me)
+        if self._err.isErr:
+            raise RuntimeError
+        count = self._data.Desc.Dict['numVisBuff']
+        if count <= 0:
+            self._eof = True
+            self._data.Close(self._err)
+            return
+        shape = len(self._data.VisBuf) // 4
+        buffer = _array(self._data.VisBuf, shape)
+        records = buffer[:count * self._lrec].reshape((count, self._lrec))
+        self._records.append(records.copy())
+        self._count += count
+        return
+
+    def __next__(self):
+        done = False
+        try:
+            while not self._eof and self._count < self._nvis:
+                self._read()
+                continue
+            done = True
+        finally:
+            if not done and not self._eof:
+                self._eof = True
+                _close_quietly(self._data)
+                pass
+            pass
+        if not self._count:
+            raise StopIteration
+        records = np.concatenate(self._records)
+        self._records = [records[self._nvis:]]
+        self._count = len(self._records[0])
+        records = records[:self._nvis]
+        block = _AIPSVisibilityBlock(self._desc, records, self._pos)
+        self._pos += len(block)
+        return block
+
+    next = __next__                     # for Python 2
+
+    pass                                # class _AIPSCalibratedBlockIter
+
+
+class _AIPSVisibilityWriter(object):
+    """This class is used to append visibility records to a UV data
+    set that has been opened for writing, using the Obit I/O
+    buffer."""
+
+    def __init__(self, data, err):
+        self._data = data
+        self._err = err
+        self._nvispio = InfoList.PGet(self._data.List, "nVisPIO")[4][0]
+        self._lrec = _uv_lrec(self._data.Desc.Dict)
+        self.count = 0
+        return
+
+    def write(self, records):
+        """Append the visibility records in RECORDS."""
+
+        pos = 0
+        while pos < len(records):
+            num = min(self._nvispio, len(records) - pos)
+            shape = len(self._data.VisBuf) // 4
+            buffer = _array(self._data.VisBuf, shape)
+            buffer[:num * self._lrec] = records[pos:pos + num].ravel()
+            for desc in (self._data.Desc, self._data.IODesc):
+                d = desc.Dict
+                d['numVisBuff'] = num
+                desc.Dict = d
+                continue
+            Obit.UVWrite(self._data.me, self._err.me)
+            if self._err.isErr:
+                raise RuntimeError
+            pos += num
+            self.count += num
+            continue
+        return
+
+    def close(self):
+        """Close the data set, which updates its header."""
+
+        self._data.Close(self._err)
+        if self._err.isErr:
+            raise RuntimeError
+        return
+
+    pass                                # class _AIPSVisibilityWriter
+
+
+class _AIPSVisibilityAverager(object):
+    """This class is used to average a stream of blocks of visibilities
+    in time and frequency.
+
+    Visibilities are averaged per baseline, source and frequency setup
+    over time bins of INTERVAL days and groups of CHANNELS channels,
+    using their weights.  The random parameters are averaged over the
+    records that have any positive weight, unless none of them has.
+    Since the stream has to be in time order, only the visibilities of
+    the last time bin seen have to be kept around."""
+
+    def __init__(self, desc, interval, channels):
+        self._nrparm = desc['nrparm']
+        self._width = self._nrparm + \
+                      (_uv_lrec(desc) - self._nrparm) // channels
+        self._inttim = desc['ilocit']
+        self._interval = interval
+        self._channels = channels
+        self._origin = None
+        self._index = 0
+        self._keys = None
+        self._rparm = None
+        self._count = None
+        self._sums = None
+        return
+
+    def _column(self, block, name):
+        try:
+            return getattr(block, name).astype(np.int64)
+        except KeyError:
+            return np.zeros(len(block), dtype=np.int64)
+        pass
+
+    def _bins(self, block):
+        if not self._interval:
+            bins = np.arange(self._index, self._index + len(block))
+        else:
+            time = block.time.astype(np.float64)
+            if self._origin is None:
+                self._origin = time[0]
+                pass
+            # Times are stored in single precision.  Allow for the
+            # rounding of times on a bin boundary by moving times
+            # that are slightly less into the next bin.
+            tolerance = 4 * np.spacing(block.time).astype(np.float64)
+            if self._inttim >= 0:
+                inttim = block.inttim.astype(np.float64) / 86400.0
+                tolerance = np.maximum(tolerance, 0.25 * inttim)
+                pass
+            time = time - self._origin + tolerance
+            bins = np.floor(time / self._interval)
+            pass
+        self._index += len(block)
+        return bins.astype(np.int64)
+
+    def _reduce(self, keys, rparm, count, sums):
+        """Combine the rows of the arrays that share the same key."""
+
+        keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind='stable')
+        starts = np.searchsorted(inverse[order], np.arange(len(keys)))
+        rparm = np.add.reduceat(rparm[order], starts, axis=0)
+        count = np.add.reduceat(count[order], starts, axis=0)
+        sums = np.add.reduceat(sums[order], starts, axis=0)
+        return keys, rparm, count, sums
+
+    def _records(self, rparm, count, sums):
+        """Turn accumulated sums into visibility records.
+
+        The second axis of RPARM and COUNT distinguishes the sums over
+        all records from those over records with a positive weight."""
+
+        width = self._nrparm + int(np.prod(sums.shape[1:]))
+        records = np.empty((len(rparm), width), dtype=np.float32)
+        # Everything but the integration time is averaged.
+        valid = count[:, 1] > 0
+        total = np.where(valid[:, np.newaxis], rparm[:, 1], rparm[:, 0])
+        total /= np.where(valid, count[:, 1], count[:, 0])[:, np.newaxis]
+        if self._inttim >= 0:
+            total[:, self._inttim] = rparm[:, 0, self._inttim]
+            pass
+        records[:, :self._nrparm] = total
+
+        vis = np.zeros(sums.shape)
+        weight = sums[..., 2]
+        valid = weight > 0
+        vis[..., 0][valid] = sums[..., 0][valid] / weight[valid]
+        vis[..., 1][valid] = sums[..., 1][valid] / weight[valid]
+        vis[..., 2] = weight
+        records[:, self._nrparm:] = vis.reshape((len(vis), -1))
+        return records
+
+    def feed(self, block):
+        """Process the visibilities in BLOCK and return the records of
+        the averaged visibilities that are complete."""
+
+        if not len(block):
+            return np.zeros((0, self._width), dtype=np.float32)
+
+        keys = np.column_stack((self._bins(block),
+                                _baseline_code(block.ant1, block.ant2,
+                                               block.subarray),
+                                self._column(block, 'source'),
+                                self._column(block, 'freqsel')))
+        # Average the channels in groups, weighting the visibilities.
+        vis = block.visibility.astype(np.float64)
+        weight = np.maximum(vis[..., 2], 0)
+        n, nif, nchan, nstokes = weight.shape
+
+        # Keep separate sums for the records that carry any weight,
+        # such that flagged records don't affect u, v, w and time.
+        rparm = block._records[:, :self._nrparm].astype(np.float64)
+        valid = (weight.reshape((n, -1)) > 0).any(axis=1)
+        rparm = np.stack((rparm, rparm * valid[:, np.newaxis]), axis=1)
+        count = np.column_stack((np.ones(n), valid.astype(np.float64)))
+        shape = (n, nif, nchan // self._channels, self._channels, nstokes)
+        sums = np.empty((n, nif, nchan // self._channels, nstokes, 3))
+        sums[..., 0] = (weight * vis[..., 0]).reshape(shape).sum(axis=3)
+        sums[..., 1] = (weight * vis[..., 1]).reshape(shape).sum(axis=3)
+        sums[..., 2] = weight.reshape(shape).sum(axis=3)
+
+        if self._keys is not None:
+            keys = np.concatenate((self._keys, keys))
+            rparm = np.concatenate((self._rparm, rparm))
+            count = np.concatenate((self._count, count))
+            sums = np.concatenate((self._sums, sums))
+            pass
+        keys, rparm, count, sums = self._reduce(keys, rparm, count, sums)
+
+        # Bins before the last one seen are complete.
+        done = keys[:, 0] < keys[-1, 0]
+        self._keys = keys[~done]
+        self._rparm = rparm[~done]
+        self._count = count[~done]
+        self._sums = sums[~done]
+        if not done.any():
+            return np.zeros((0, self._width), dtype=np.float32)
+        return self._records(rparm[done], count[done], sums[done])
+
+    def finish(self):
+        """Return the records of the remaining averaged visibilities."""
+
+        if self._keys is None or not len(self._keys):
+            return np.zeros((0, self._width), dtype=np.float32)
+        records = self._records(self._rparm, self._count, self._sums)
+        self._keys = None
+        return records
+
+    pass                                # class _AIPSVisibilityAverager
+
+
+def _create_uv(name, klass, disk, seq, userno, desc, nvispio, err):
+    """Create a new UV data set NAME.KLASS.SEQ on disk DISK for user
+    USERNO and return the Obit object for it, opened for writing.
+
+    The entries in DESC override those of the default descriptor, and
+    the I/O buffer holds NVISPIO visibilities."""
+
+    OSystem.PSetAIPSuser(userno)
+    data = UV.newPAUV(name, name, klass, disk, seq, False, err)
+    if err.isErr:
+        raise RuntimeError
+    d = data.Desc.Dict
+    d.update(desc)
+    d['nvis'] = 0
+    d['firstVis'] = 0
+    d['numVisBuff'] = 0
+    data.Desc.Dict = d
+    InfoList.PAlwaysPutInt(data.List, "nVisPIO", [1, 1, 1, 1, 1], [nvispio])
+    data.Open(2, err)
+    if err.isErr:
+        raise RuntimeError
+    return data
+
+
+def _created_seq(data, userno, err):
+    """Return the sequence number of the new UV data set DATA."""
+
+    # The sequence number may have been assigned while the data set
+    # was created.  Check it out based on the catalog number.
+    seq = data.Aseq
+    if seq == 0:
+        entry = AIPSDir.PInfo(data.Disk, userno, data.Acno, err)
+        seq = int(entry[20:25])
+        pass
+    return seq
+
+
+def _export_columns(block):
+    """Return the columns written by AIPSUVData.export() for the
+    visibilities in BLOCK."""
+
+    columns = OrderedDict()
+    columns['time'] = block.time
+    columns['baseline'] = np.column_stack((block.ant1, block.ant2))
+    columns['subarray'] = block.subarray
+    columns['uvw'] = np.column_stack((block.u, block.v, block.w))
+    for name in ('source', 'freqsel', 'inttim'):
+        try:
+            value = getattr(block, name)
+        except KeyError:
+            continue
+        if name != 'inttim':
+            value = value.astype(np.int32)
+            pass
+        columns[name] = value
+        continue
+    columns['visibility'] = block.visibility
+    return columns
+
+
+class _AIPSExportHDF5(object):
+    """This class is used to write columns of visibilities to an HDF5
+    file, using chunked and compressed datasets."""
+
+    def __init__(self, path, nvis, chunk, metadata):
+        self._file = h5py.File(path, 'w')
+        self._nvis = nvis
+        self._chunk = chunk
+        self._pos = 0
+        self._file.attrs['header'] = json.dumps(metadata['header'])
+        for name in ('antennas', 'sources', 'stokes'):
+            values = [value.encode('ascii') for value in metadata[name]]
+            self._file.create_dataset(name, data=np.array(values, dtype='S'))
+            continue
+        self._file.create_dataset('frequencies',
+                                  data=metadata['frequencies'])
+        return
+
+    def write(self, columns):
+        for name in columns:
+            value = columns[name]
+            if not name in self._file:
+                shape = (self._nvis,) + value.shape[1:]
+                if not self._nvis:
+                    # HDF5 can't chunk a dataset without visibilities.
+                    self._file.create_dataset(name, shape,
+                                              dtype=value.dtype)
+                    continue
+                chunks = (min(self._chunk, self._nvis),) + value.shape[1:]
+                self._file.create_dataset(name, shape, dtype=value.dtype,
+                                          chunks=chunks, compression='gzip',
+                                          shuffle=True)
+                pass
+            self._file[name][self._pos:self._pos + len(value)] = value
+            continue
+        self._pos += len(value)
+        return
+
+    def close(self):
+        self._file.close()
+        return
+
+    pass                                # class _AIPSExportHDF5
+
+
+class _AIPSExportNPZ(object):
+    """This class is used to write columns of visibilities to a
+    compressed NumPy .npz file.
+
+    Each column is first written to a temporary .npy file, such that
+    the visibilities don't have to be kept in memory."""
+
+    def __init__(self, path, nvis, chunk, metadata):
+        self._path = path
+        self._nvis = nvis
+        self._dir = tempfile.mkdtemp()
+        self._files = OrderedDict()
+        self._metadata = metadata
+        return
+
+    def write(self, columns):
+        for name in columns:
+            value = columns[name]
+            if not name in self._files:
+                file = open(os.path.join(self._dir, name + '.npy'), 'wb')
+                header = {'descr': np.lib.format.dtype_to_descr(value.dtype),
+                          'fortran_order': False,
+                          'shape': (self._nvis,) + value.shape[1:]}
+                np.lib.format.write_array_header_2_0(file, header)
+                self._files[name] = file
+                pass
+            self._files[name].write(np.ascontiguousarray(value).tobytes())
+            continue
+        return
+
+    def close(self):
+        try:
+            for name in self._files:
+                self._files[name].close()
+                continue
+            archive = zipfile.ZipFile(self._path, 'w', zipfile.ZIP_DEFLATED,
+                                      allowZip64=True)
+            try:
+                for name in self._files:
+                    archive.write(self._files[name].name, name + '.npy')
+                    continue
+                metadata = self._metadata
+                arrays = {'header': np.array(json.dumps(metadata['header'])),
+                          'antennas': np.array(metadata['antennas'], dtype='U'),
+                          'sources': np.array(metadata['sources'], dtype='U'),
+                          'stokes': np.array(metadata['stokes'], dtype='U'),
+                          'frequencies': metadata['frequencies']}
+                for name in arrays:
+                    filename = os.path.join(self._dir, name + '.npy')
+                    np.save(filename, arrays[name])
+                    archive.write(filename, name + '.npy')
+                    continue
+            finally:
+                archive.close()
+                pass
+        finally:
+            shutil.rmtree(self._dir)
+            pass
+        return
+
+    pass                                # class _AIPSExportNPZ
+
+
+class _AIPSStatistics(object):
+    """This class is used to accumulate statistics of the amplitudes
+    and phases of a stream of blocks of visibilities, grouped by any
+    of baseline, source, IF, channel and Stokes parameter.
+
+    Means and variances of the amplitudes are computed per block and
+    merged into the running totals using the parallel form of
+    Welford's algorithm, which avoids the loss of precision of naive
+    sums of squares."""
+
+    _row_fields = ('baseline', 'source')
+    _data_fields = ('if', 'channel', 'stokes')
+
+    def __init__(self, by):
+        for field in by:
+            if not field in self._row_fields + self._data_fields:
+                msg = "Cannot group statistics by '%s'" % field
+                raise ValueError(msg)
+            continue
+        self._rows = [field for field in self._row_fields if field in by]
+        # The data axes that are not grouped by, counting from the
+        # axis that holds the IFs.
+        self._axes = tuple([axis + 1 for axis in range(3)
+                            if not self._data_fields[axis] in by])
+        self._groups = {}
+        self._keys = []
+        self._sums = None
+        return
+
+    def _row_keys(self, block):
+        keys = [np.zeros(len(block), dtype=np.int64)]
+        if 'baseline' in self._rows:
+            keys.append(_baseline_code(block.ant1, block.ant2,
+                                       block.subarray))
+            pass
+        if 'source' in self._rows:
+            try:
+                keys.append(block.source.astype(np.int64))
+            except KeyError:
+                keys.append(np.ones(len(block), dtype=np.int64))
+                pass
+            pass
+        return np.column_stack(keys)
+
+    def _reduce(self, values, order, starts):
+        values = values.sum(axis=self._axes)
+        return np.add.reduceat(values[order], starts, axis=0)
+
+    def _expand(self, values):
+        for axis in self._axes:
+            values = np.expand_dims(values, axis)
+            continue
+        return values
+
+    def _grow(self, shape):
+        count = len(self._keys)
+        if self._sums is None:
+            self._sums = {}
+            for name in ('count', 'flagged', 'mean', 'm2', 'real', 'imag',
+                         'cos', 'sin'):
+                self._sums[name] = np.zeros((0,) + shape)
+                continue
+            pass
+        for name in self._sums:
+            sums = self._sums[name]
+            if len(sums) < count:
+                extra = np.zeros((count - len(sums),) + shape)
+                self._sums[name] = np.concatenate((sums, extra))
+                pass
+            continue
+        return
+
+    def feed(self, block, mask=None):
+        """Process the visibilities in BLOCK.  Data for which MASK is
+        True is counted as flagged."""
+
+        if not len(block):
+            return
+        vis = block.visibility.astype(np.float64)
+        valid = vis[..., 2] > 0
+        if mask is not None:
+            valid &= ~mask
+            pass
+        real = np.where(valid, vis[..., 0], 0)
+        imag = np.where(valid, vis[..., 1], 0)
+        amp = np.hypot(real, imag)
+        nonzero = amp > 0
+        cos = np.where(nonzero, real / np.where(nonzero, amp, 1), 0)
+        sin = np.where(nonzero, imag / np.where(nonzero, amp, 1), 0)
+
+        # Group the visibilities, and map the groups onto the groups
+        # seen so far.
+        keys, inverse = np.unique(self._row_keys(block), axis=0,
+                                  return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind='stable')
+        starts = np.searchsorted(inverse[order], np.arange(len(keys)))
+        index = np.empty(len(keys), dtype=np.int64)
+        for i in range(len(keys)):
+            key = tuple(keys[i])
+            if not key in self._groups:
+                self._groups[key] = len(self._keys)
+                self._keys.append(key)
+                pass
+            index[i] = self._groups[key]
+            continue
+
+        count = self._reduce(valid.astype(np.float64), order, starts)
+        flagged = self._reduce((~valid).astype(np.float64), order, starts)
+        mean = self._reduce(amp, order, starts) / np.maximum(count, 1)
+        deviation = amp - self._expand(mean[inverse])
+        m2 = self._reduce(np.where(valid, deviation ** 2, 0), order, starts)
+
+        self._grow(count.shape[1:])
+        sums = self._sums
+        n = sums['count'][index]
+        total = np.maximum(n + count, 1)
+        delta = mean - sums['mean'][index]
+        sums['mean'][index] += delta * count / total
+        sums['m2'][index] += m2 + delta ** 2 * n * count / total
+        sums['count'][index] += count
+        sums['flagged'][index] += flagged
+        sums['real'][index] += self._reduce(real, order, starts)
+        sums['imag'][index] += self._reduce(imag, order, starts)
+        sums['cos'][index] += self._reduce(cos, order, starts)
+        sums['sin'][index] += self._reduce(sin, order, starts)
+        return
+
+    def finish(self):
+        """Return the statistics as a dictionary of arrays."""
+
+        result = {}
+        if self._sums is None:
+            return result
+        order = sorted(range(len(self._keys)), key=lambda i: self._keys[i])
+        sums = {}
+        for name in self._sums:
+            sums[name] = self._sums[name][order]
+            continue
+        keys = np.array([self._keys[i] for i in order], dtype=np.int64)
+        column = 1
+        if 'baseline' in self._rows:
+            codes = keys[:, column]
+            result['baseline'] = np.column_stack(((codes >> 36) & 0xfff,
+                                                  (codes >> 24) & 0xfff))
+            result['subarray'] = codes & 0xffffff
+            column += 1
+            pass
+        if 'source' in self._rows:
+            result['source'] = keys[:, column]
+            pass
+
+        count = sums['count']
+        total = count + sums['flagged']
+        result['count'] = count.astype(np.int64)
+        result['flagged'] = sums['flagged'].astype(np.int64)
+        result['flagged_fraction'] = sums['flagged'] / np.maximum(total, 1)
+        result['amp_mean'] = sums['mean']
+        result['amp_rms'] = np.sqrt(sums['m2'] / np.maximum(count, 1))
+        result['phase_mean'] = np.degrees(np.arctan2(sums['imag'],
+                                                     sums['real']))
+        # The circular standard deviation of the phases.
+        length = np.hypot(sums['cos'], sums['sin']) / np.maximum(count, 1)
+        length = np.clip(length, 1e-300, 1)
+        result['phase_rms'] = np.degrees(np.sqrt(-2 * np.log(length)))
+        if not self._rows:
+            for name in result:
+                result[name] = result[name][0]
+                continue
+            pass
+        return result
+
+    pass                                # class _AIPSStatistics
+
+
+class _AIPSScanFinder(object):
+    """This class is used to split a stream of blocks of visibilities
+    into scans.
+
+    A new scan starts whenever the source, frequency setup or subarray
+    changes, when there is a gap of more than GAP days between
+    subsequent visibilities, or when a scan would become longer than
+    MAXLEN days."""
+
+    def __init__(self, gap, maxlen):
+        self._gap = gap
+        self._maxlen = maxlen
+        self._scan = None
+        self.scans = []
+        return
+
+    def _open(self, index, time, key, start, piece):
+        self._close()
+        self._scan = {'start_vis': index, 'end_vis': index,
+                      'start_time': time, 'end_time': time, 'key': key,
+                      'segment': start, 'piece': piece}
+        return
+
+    def _close(self):
+        if self._scan:
+            self.scans.append(self._scan)
+            self._scan = None
+            pass
+        return
+
+    def _keys(self, block, name):
+        try:
+            return getattr(block, name).astype(np.int32)
+        except KeyError:
+            return np.ones(len(block), dtype=np.int32)
+        pass
+
+    def feed(self, block):
+        """Process the visibilities in BLOCK."""
+
+        time = block.time.astype(np.float64)
+        source = self._keys(block, 'source')
+        freqsel = self._keys(block, 'freqsel')
+        subarray = block.subarray
+
+        new = np.empty(len(block), dtype=bool)
+        new[1:] = (source[1:] != source[:-1]) | \
+                  (freqsel[1:] != freqsel[:-1]) | \
+                  (subarray[1:] != subarray[:-1])
+        if self._gap:
+            new[1:] |= (time[1:] - time[:-1] > self._gap)
+            pass
+        if self._scan:
+            key = self._scan['key']
+            new[0] = (key != (source[0], freqsel[0], subarray[0]))
+            if self._gap:
+                new[0] |= (time[0] - self._scan['end_time'] > self._gap)
+                pass
+        else:
+            new[0] = True
+            pass
+
+        bounds = list(np.nonzero(new)[0]) + [len(block)]
+        if bounds[0] != 0:
+            bounds.insert(0, 0)
+            pass
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            if new[a]:
+                start = time[a]
+            else:
+                start = self._scan['segment']
+                pass
+            if self._maxlen:
+                piece = np.floor((time[a:b] - start) / self._maxlen)
+            else:
+                piece = np.zeros(b - a)
+                pass
+            key = (source[a], freqsel[a], subarray[a])
+            if new[a] or piece[0] != self._scan['piece']:
+                self._open(block.first + a, time[a], key, start, piece[0])
+                pass
+            for c in np.nonzero(piece[1:] != piece[:-1])[0] + 1:
+                self._scan['end_vis'] = block.first + a + c - 1
+                self._scan['end_time'] = time[a + c - 1]
+                self._open(block.first + a + c, time[a + c], key, start,
+                           piece[c])
+                continue
+            self._scan['end_vis'] = block.first + b - 1
+            self._scan['end_time'] = time[b - 1]
+            self._scan['piece'] = piece[-1]
+            continue
+        return
+
+    def finish(self):
+        """Return the list of scans found."""
+
+        self._close()
+        return self.scans
+
+    pass                                # class _AIPSScanFinder
+
+
+class _AIPSFlags(object):
+    """This class is used to apply the flags in a flag (FG) table to
+    blocks of visibilities.
+
+    The rows of the table are compiled into time intervals, grouped by
+    antenna and sorted by start time, such that only the flags that
+    can possibly apply to a block are considered for that block."""
+
+    def __init__(self, table):
+        columns = table.to_arrays(['source', 'subarray', 'freq_id', 'ants',
+                                   'time_range', 'ifs', 'chans', 'pflags'])
+        entries = {}
+        for i in range(len(columns['source'])):
+            pflags = columns['pflags'][i].astype(bool)
+            if not pflags.any():
+                continue
+            start, end = [float(x) for x in columns['time_range'][i]]
+            if start == 0 and end == 0:
+                start, end = -np.inf, np.inf
+                pass
+            ants = [int(x) for x in columns['ants'][i]]
+            ifs = [int(x) for x in columns['ifs'][i]]
+            chans = [int(x) for x in columns['chans'][i]]
+            entry = (start, end, ants[0], ants[1], int(columns['source'][i]),
+                     int(columns['subarray'][i]), int(columns['freq_id'][i]),
+                     slice(max(ifs[0] - 1, 0), ifs[1] or None),
+                     slice(max(chans[0] - 1, 0), chans[1] or None),
+                     pflags)
+            entries.setdefault(ants[0] or ants[1], []).append(entry)
+            continue
+
+        # For each antenna keep the start and end times of the
+        # intervals, as well as the latest end time seen so far.
+        # Since the latter never decreases, both can be searched.
+        self._intervals = {}
+        for antenna in entries:
+            rows = sorted(entries[antenna], key=lambda entry: entry[0])
+            start = np.array([entry[0] for entry in rows])
+            end = np.array([entry[1] for entry in rows])
+            self._intervals[antenna] = \
+                (start, end, np.maximum.accumulate(end), rows)
+            continue
+        return
+
+    def _column(self, block, name):
+        try:
+            return getattr(block, name).astype(np.int32)
+        except KeyError:
+            return None
+        pass
+
+    def mask(self, block):
+        """Return the flags for BLOCK as a boolean array with shape
+        (count, nif, nchan, nstokes)."""
+
+        mask = np.zeros(block.visibility.shape[:-1], dtype=bool)
+        if not len(block) or not self._intervals:
+            return mask
+
+        time = block.time.astype(np.float64)
+        ant1 = block.ant1
+        ant2 = block.ant2
+        subarray = block.subarray
+        source = self._column(block, 'source')
+        freqsel = self._column(block, 'freqsel')
+        tmin, tmax = time.min(), time.max()
+
+        antennas = set(np.unique(ant1)) | set(np.unique(ant2)) | set([0])
+        for antenna in antennas:
+            if not antenna in self._intervals:
+                continue
+            start, end, latest, rows = self._intervals[antenna]
+            lo = np.searchsorted(latest, tmin)
+            hi = np.searchsorted(start, tmax, 'right')
+            for i in range(lo, hi):
+                if end[i] < tmin:
+                    continue
+                t0, t1, a1, a2, src, sub, fqid, ifs, chans, pflags = rows[i]
+                sel = (time >= t0) & (time <= t1)
+                if a1 or a2:
+                    sel &= ((a1 == 0) | (ant1 == a1)) & \
+                           ((a2 == 0) | (ant2 == a2)) | \
+                           ((a1 == 0) | (ant2 == a1)) & \
+                           ((a2 == 0) | (ant1 == a2))
+                    pass
+                if src and source is not None:
+                    sel &= (source == src)
+                    pass
+                if sub:
+                    sel &= (subarray == sub)
+                    pass
+                if fqid > 0 and freqsel is not None:
+                    sel &= (freqsel == fqid)
+                    pass
+                if sel.any():
+                    mask[sel, ifs, chans] |= pflags[:mask.shape[-1]]
+                    pass
+                continue
+            continue
+        return mask
+
+    pass                                # class _AIPSFlags
+
+
+class _AIPSCalibration(object):
+    """This class is used to evaluate the solutions in a solution (SN)
+    or calibration (CL) table at arbitrary times.
+
+    The rows of the table are grouped by subarray and antenna and
+    sorted by time.  For each group the complex gains, delays and
+    rates are kept as arrays with shape (count, nif, npol), with
+    blanked or zero-weight entries set to NaN."""
+
+    def __init__(self, table, frequencies):
+        npol = 1
+        if 'real2' in table._columns:
+            npol = 2
+            pass
+        names = ['time', 'antenna_no', 'subarray']
+        for pol in range(1, npol + 1):
+            names += ['real%d' % pol, 'imag%d' % pol, 'delay_%d' % pol,
+                      'rate_%d' % pol, 'weight_%d' % pol]
+            continue
+        columns = table.to_arrays(names)
+        count = len(columns['time'])
+
+        def stack(name):
+            arrays = []
+            for pol in range(1, npol + 1):
+                array = columns[name % pol].astype(np.float64)
+                arrays.append(array.reshape((count, -1)))
+                continue
+            return np.stack(arrays, axis=-1)
+
+        valid = stack('weight_%d') > 0
+        gains = stack('real%d') + 1j * stack('imag%d')
+        valid &= np.isfinite(gains)
+        gains[~valid] = np.nan
+        delays = np.where(valid, stack('delay_%d'), np.nan)
+        rates = np.where(valid, stack('rate_%d'), np.nan)
+
+        self.nif = gains.shape[1]
+        self.npol = npol
+        self._frequencies = np.asarray(frequencies, dtype=np.float64)
+
+        time = columns['time'].astype(np.float64)
+        keys = columns['subarray'].astype(np.int64) * 65536 + \
+               columns['antenna_no']
+        order = np.lexsort((time, keys))
+        keys = keys[order]
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        self._groups = {}
+        for rows in np.split(order, bounds):
+            if not len(rows):
+                continue
+            key = (int(columns['subarray'][rows[0]]),
+                   int(columns['antenna_no'][rows[0]]))
+            self._groups[key] = (time[rows], gains[rows], delays[rows],
+                                 rates[rows])
+            continue
+        return
+
+    def _nearest(self, times, time):
+        """Return the indices of the elements of TIMES closest to
+        each element of TIME."""
+
+        i = np.searchsorted(times, time)
+        i = np.clip(i, 1, len(times) - 1)
+        earlier = (time - times[i - 1]) <= (times[i] - time)
+        return np.where(earlier, i - 1, i)
+
+    def _phase(self, times, gains, rates, frequency, method):
+        """Return the phases of GAINS with the ambiguities between
+        consecutive solutions resolved."""
+
+        phase = np.angle(gains)
+        if method != 'ambig':
+            return np.unwrap(phase)
+
+        # Resolve the ambiguities using the phase change predicted
+        # by the mean of the rates of consecutive solutions.
+        rates = np.nan_to_num(rates)
+        predicted = 2 * np.pi * frequency * 0.5 * (rates[1:] + rates[:-1]) * \
+                    np.diff(times) * 86400.0
+        delta = np.angle(np.exp(1j * np.diff(phase)))
+        delta += 2 * np.pi * np.round((predicted - delta) / (2 * np.pi))
+        return np.concatenate((phase[:1], phase[0] + np.cumsum(delta)))
+
+    def _evaluate(self, what, antenna, time, method, subarray):
+        if not method in ('nearest', 'linear', 'ambig'):
+            msg = "Unknown interpolation method '%s'" % method
+            raise ValueError(msg)
+
+        time = np.asarray(time, dtype=np.float64)
+        antenna, time = np.broadcast_arrays(np.asarray(antenna), time)
+        shape = time.shape
+        antenna = antenna.ravel()
+        time = time.ravel()
+        if what == 'gains':
+            result = np.full((len(time), self.nif, self.npol), np.nan + 0j)
+        else:
+            result = np.full((len(time), self.nif, self.npol), np.nan)
+            pass
+
+        for ant in np.unique(antenna):
+            key = (subarray, int(ant))
+            if not key in self._groups:
+                continue
+            sel = np.flatnonzero(antenna == ant)
+            t = time[sel]
+            times, gains, delays, rates = self._groups[key]
+            values = {'gains': gains, 'delays': delays, 'rates': rates}[what]
+            for i in range(self.nif):
+                for j in range(self.npol):
+                    valid = np.isfinite(values[:, i, j])
+                    if not valid.any():
+                        continue
+                    x = times[valid]
+                    y = values[valid, i, j]
+                    if method == 'nearest' or len(x) == 1:
+                        result[sel, i, j] = y[self._nearest(x, t)]
+                    elif what == 'gains':
+                        phase = self._phase(x, y, rates[valid, i, j],
+                                            self._frequencies[i], method)
+                        amp = np.interp(t, x, np.abs(y))
+                        phase = np.interp(t, x, phase)
+                        result[sel, i, j] = amp * np.exp(1j * phase)
+                    else:
+                        result[sel, i, j] = np.interp(t, x, y)
+                        pass
+                    continue
+                continue
+            continue
+        return result.reshape(shape + (self.nif, self.npol))
+
+    def gains(self, antenna, time, method='linear', subarray=1):
+        """Return the complex gains for ANTENNA at TIME.
+
+        ANTENNA and TIME can be arrays, for example the ant1 and time
+        attributes of a block of visibilities.  The result has shape
+        (count, nif, npol).  METHOD is 'nearest' to use the nearest
+        solution, 'linear' to interpolate amplitude and phase linearly
+        between solutions, or 'ambig' to do so while using the rates
+        to resolve phase ambiguities between solutions.  Times outside
+        the range covered by the solutions take the first or last
+        solution.  Antennas without valid solutions give NaN."""
+
+        return self._evaluate('gains', antenna, time, method, subarray)
+
+    def delays(self, antenna, time, method='linear', subarray=1):
+        """Return the delays (in seconds) for ANTENNA at TIME."""
+
+        if method == 'ambig':
+            method = 'linear'
+            pass
+        return self._evaluate('delays', antenna, time, method, subarray)
+
+    def rates(self, antenna, time, method='linear', subarray=1):
+        """Return the rates (in seconds per second) for ANTENNA at
+        TIME."""
+
+        if method == 'ambig':
+            method = 'linear'
+            pass
+        return self._evaluate('rates', antenna, time, method, subarray)
+
+    pass                                # class _AIPSCalibration
+
+
+def _map_chunk(uvdata, func, reducer, start, stop, nvis):
+    """Apply FUNC to the blocks of visibilities START up to STOP of
+    UVDATA and combine the results using REDUCER."""
+
+    result = None
+    first = True
+    for block in uvdata[start:stop].iter_blocks(nvis):
+        if first:
+            result = func(block)
+            first = False
+        else:
+            result = reducer(result, func(block))
+            pass
+        continue
+    return result
+
+def _map_worker(args):
+    """Open a UV data set by itself and apply a function to a chunk of
+    its visibilities, on behalf of AIPSUVData.map_reduce()."""
+
+    name, klass, disk, seq, userno, func, reducer, start, stop, nvis = args
+    uvdata = AIPSUVData(name, klass, disk, seq, userno)
+    return _map_chunk(uvdata, func, reducer, start, stop, nvis)
+
+
+class _AIPSDataKeywords:
+    def __init__(self, data, obit, err):
+        self._err = err
+        self._data = data
+        self._obit = obit
+        return
+
+    def __getitem__(self, key):
+        key = key.upper().ljust(8)
+        value = InfoList.PGet(self._data.Desc.List, key)
+        return _scalarize(value[4])
+
+    def __setitem__(self, key, value):
+        key = key.upper().ljust(8)
+        try:
+            _type = InfoList.PGet(self._data.Desc.List, key)[2]
+        except:
+            # New keys are either strings or floats.
+            if type(value) == str:
+                _type = 14
+            else:
+                _type = 10
+                pass
+            pass
+        if _type in (2, 3, 4):
+            value = int(value)
+            InfoList.PAlwaysPutInt(self._data.Desc.List, key,
+                                   [1, 1, 1, 1, 1], _vectorize(value))
+        elif _type == 10:
+            value = float(value)
+            InfoList.PAlwaysPutFloat(self._data.Desc.List, key,
+                                     [1, 1, 1, 1, 1], _vectorize(value))
+        elif _type == 11:
+            value = float(value)
+            InfoList.PAlwaysPutDouble(self._data.Desc.List, key,
+                                      [1, 1, 1, 1, 1], _vectorize(value))
+        elif _type == 14:
+            value = str(value).ljust(8)
+            InfoList.PAlwaysPutString(self._data.Desc.List, key,
+                                      [8, 1, 1, 1, 1], _vectorize(value))
+        elif _type == 15:
+            value = bool(value)
+            InfoList.PAlwaysPutBoolean(self._table.Desc.List, key,
+                                      [1, 1, 1, 1, 1], _vectorize(value))
+        else:
+            raise AssertionError("not implemented")
+        self._obit.PDirty(self._data)
+        return
+
+    def _generate_dict(self):
+        dict = {}
+        for key in self._data.Desc.List.Dict:
+            if self._data.Desc.List.Dict[key][0] == 13:
+                dict[key] = self._data.Desc.List.Dict[key][2][0]
+            else:
+                dict[key] = _scalarize(self._data.Desc.List.Dict[key][2])
+                pass
+            continue
+        return dict
+
+    def __str__(self):
+        return str(self._generate_dict())
+
+    def update(self):
+        self._obit.PUpdateDesc(self._data, self._err)
+        pass
+
+    pass                                # class _AIPSDataKeywords
+
+
+class _AIPSDataHeader(object):
+    def __init__(self, data, obit, err):
+        self._err = err
+        self._data = data
+        self._obit = obit
+        self._dict = data.Desc.Dict
+        for key in self._strip:
+            if self._keys[key] in self._dict:
+                value = _rstrip(self._dict[self._keys[key]])
+                self._dict[self._keys[key]] = value
+                pass
+            continue
+        return
+
+    _keys = {'object': 'object',
+             'telescop': 'teles',
+             'instrume': 'instrume',
+             'observer': 'observer',
+             'date_obs': 'obsdat',
+             'date_map': 'date',
              'bunit': 'bunit',
              'ndim': 'naxis',
              'naxis': 'inaxes',
@@ -1086,153 +3443,853 @@ class _AIPSData(object):
         if force:
             self.clrstat()
             pass
-        self._data.Zap(self._err)
-        return
+        self._data.Zap(self._err)
+        return
+
+    def clrstat(self):
+        """Reset file 'busy' status in the AIPS catalogue."""
+        cno = Obit.AIPSDirFindCNO(self._data.Disk, self._userno,
+                                  self._data.Aname, self._data.Aclass,
+                                  self._type, self._data.Aseq,
+                                  self._err.me)
+        Obit.AIPSDirStatus(self._data.Disk, self._userno, cno, 4, self._err.me)
+        return
+
+    def update(self):
+        """Synchronise the data object with the AIPS catalogue entry."""
+        self._obit.PUpdateDesc(self._data, self._err)
+        return
+
+    pass                                # class _AIPSData
+
+
+class AIPSImage(_AIPSData):
+    """This class is used to access an AIPS image."""
+
+    def _init(self, name, klass, disk, seq, userno):
+        self._obit = Image
+        self._type = 'MA'
+        if userno == -1:
+            userno = AIPS.userno
+            pass
+        self._userno = userno
+        self._err = OErr.OErr()
+        self._squeezed = False
+        OSystem.PSetAIPSuser(userno)
+        self._data = Image.newPAImage(name, name, klass, disk, seq,
+                                      True, self._err)
+        if self._err.isErr:
+            raise RuntimeError
+        return
+
+    def _pixels(self):
+        Obit.ImageRead(self._data.me, self._err.me)
+        if self._err.isErr:
+            raise RuntimeError("Reading image pixels")
+        shape = []
+        for len in self.header['naxis']:
+            if self._squeezed and len == 1:
+                continue
+            shape.insert(0, len)
+            continue
+        shape = tuple(shape)
+        pixels = _array(self._data.PixBuf, shape)
+        return pixels
+    pixels = property(_pixels)
+
+    def squeeze(self):
+        """Remove degenerate dimensions from image."""
+
+        self._squeezed = True
+        return
+        
+
+    def attach_table(self, name, version, **kwds):
+        """Attach an extension table to this image.
+
+        A new extension table is created if the extension table NAME
+        with version VERSION doesn't exist.  If VERSION is 0, a new
+        extension table is created with a version that is one higher
+        than the highest available version."""
+
+        if not name.startswith('AIPS '):
+            name = 'AIPS ' + name
+
+        if version == 0:
+            version = Obit.ImageGetHighVer(self._data.me, name) + 1
+
+        no_parms = 0
+        if 'no_parms' in kwds:
+            no_parms = kwds['no_parms']
+        data = Obit.ImageCastData(self._data.me)
+        if name == 'AIPS CC':
+            Obit.TableCC(data, [version], 3, name, no_parms, self._err.me)
+        elif name == 'AIPS FG':
+            Obit.TableFG(data, [version], 3, name, self._err.me)
+        elif name == 'AIPS PS':
+            Obit.TablePS(data, [version], 3, name, self._err.me)
+        elif name == 'AIPS SN':
+            Obit.TableSN(data, [version], 3, name,
+                         kwds['no_pol'], kwds['no_if'], self._err.me)
+        else:
+            msg = 'Attaching %s tables is not implemented yet' % name
+            raise NotImplementedError(msg)
+        if self._err.isErr:
+            raise RuntimeError
+        return _AIPSTable(self._data, name, version)
+
+    history = property(lambda self: _AIPSHistory(self._data))
+
+    def update(self):
+        Obit.ImageWrite(self._data.me, self._err.me)
+        if self._err.isErr:
+            raise RuntimeError("Writing image pixels")
+        pass
+        _AIPSData.update(self)
+
+    pass                                # class AIPSImage
+
+
+class AIPSUVData(_AIPSData):
+    """This class is used to access an AIPS UV data set."""
+
+    def _init(self, name, klass, disk, seq, userno):
+        self._obit = UV
+        self._type = 'UV'
+        if userno == -1:
+            userno = AIPS.userno
+        self._userno = userno
+        self._err = OErr.OErr()
+        OSystem.PSetAIPSuser(userno)
+        self._data = UV.newPAUV(name, name, klass, disk, seq, True, self._err)
+        if self._err.isErr:
+            raise RuntimeError
+        self._antennas = []
+        self._polarizations = []
+        self._sources = []
+        self._open = False
+        self._cache = None
+        return
+
+    def __len__(self):
+        return int(self._data.Desc.Dict['nvis'])
+
+    def __getitem__(self, name):
+        if not self._open:
+            self._data.Open(3, self._err)
+            self._open = True
+            pass
+        if type(name) == str:
+            return _AIPSVisibilitySel(self, name)
+        elif type(name) == slice:
+            if name.step and not name.step == 1:
+                indices = range(*name.indices(len(self)))
+                return _AIPSVisibilityIndex(self, indices)
+            return _AIPSVisibilitySlice(self, name)
+        elif type(name) in (list, tuple) or \
+                (numpystatus and isinstance(name, np.ndarray)):
+            return _AIPSVisibilityIndex(self, name)
+        if not numpystatus:
+            return _AIPSVisibility(self._data, self._err, name)
+        if name < 0:
+            name = len(self) + name
+            pass
+        if name < 0 or name >= len(self):
+            raise IndexError("list index out of range")
+        return _AIPSCachedVisibility(self, name)
+
+    def __iter__(self):
+        self._sync_cache()
+        if not self._open:
+            self._data.Open(3, self._err)
+            self._open = True
+            pass
+        return _AIPSVisibilityIter(self._data, self._err)
+
+    def _visibility_cache(self):
+        """Return the cache used for random access to visibilities."""
+
+        if not self._cache:
+            self._cache = _AIPSVisibilityCache(self._data, self._err,
+                                               _cache_blocks)
+            pass
+        return self._cache
+
+    def _sync_cache(self):
+        """Write back and drop the visibilities cached for random
+        access."""
+
+        if self._cache:
+            self._cache.flush()
+            self._cache = None
+            pass
+        return
+
+    def flush(self):
+        """Write back changes to visibilities accessed by index.
+
+        Visibilities accessed by index are cached and changes made by
+        calling update() are only written back to the data set when
+        they drop out of the cache or when this function is
+        called."""
+
+        if self._cache:
+            self._cache.flush()
+            pass
+        return
+
+    def read_block(self, start, count, flags=None):
+        """Read a block of visibilities.
+
+        Returns COUNT visibilities starting at visibility START as a
+        block of arrays.  The block is truncated at the end of the
+        data set.  If FLAGS is specified, the 'flags' attribute of the
+        block holds the flags from that version of the FG table."""
+
+        self._sync_cache()
+
+        if start < 0:
+            start = len(self) + start
+            pass
+        if start < 0 or start >= len(self) or count < 1:
+            raise IndexError("list index out of range")
+        count = min(count, len(self) - start)
+        if not self._open:
+            self._data.Open(3, self._err)
+            self._open = True
+            pass
+        buffer = _AIPSVisibilityBuffer(self._data, self._err)
+        records = buffer.fetch(start, count)
+        block = _AIPSVisibilityBlock(self._data.Desc.Dict, records, start)
+        if flags is not None:
+            block.flags = self._flags(flags).mask(block)
+            pass
+        return block
+
+    def write_block(self, start, arrays):
+        """Write a block of visibilities.
+
+        ARRAYS is either a block returned by read_block() or a
+        dictionary that maps field names ('u', 'time', 'visibility',
+        ...) to arrays with one element per visibility.  The
+        visibilities are written back starting at visibility START.
+        Fields that are not present in a dictionary are left
+        unchanged."""
+
+        self._sync_cache()
+
+        if start < 0:
+            start = len(self) + start
+            pass
+        if not self._open:
+            self._data.Open(3, self._err)
+            self._open = True
+            pass
+        buffer = _AIPSVisibilityBuffer(self._data, self._err)
+        if isinstance(arrays, _AIPSVisibilityBlock):
+            if arrays.indices is not None:
+                msg = 'Cannot write back a block of selected visibilities'
+                raise NotImplementedError(msg)
+            records = arrays._records
+        else:
+            count = max([len(arrays[name]) for name in arrays])
+            if start < 0 or start + count > len(self):
+                raise IndexError("list index out of range")
+            block = _AIPSVisibilityBlock(self._data.Desc.Dict,
+                                         buffer.fetch(start, count), start)
+            block._assign(arrays)
+            records = block._records
+            pass
+        if start < 0 or start + len(records) > len(self):
+            raise IndexError("list index out of range")
+        buffer.store(start, records)
+        return
+
+    def resize_buffer(self, nvis=None, memory=None):
+        """Resize the I/O buffer used to access the visibilities.
+
+        The buffer is resized to hold NVIS visibilities, or as many
+        visibilities as fit in MEMORY bytes.  If neither is specified,
+        the size is chosen based on the size of a visibility record
+        and the amount of available memory.  Returns the number of
+        visibilities that fit in the new buffer."""
+
+        self._sync_cache()
+
+        if not nvis:
+            if not memory:
+                memory = _buffer_memory
+                available = _available_memory()
+                if available:
+                    memory = min(memory, available // 16)
+                    pass
+                pass
+            nvis = memory // (4 * _uv_lrec(self._data.Desc.Dict))
+            pass
+        nvis = int(max(1, min(nvis, len(self))))
+
+        # Reopen the file to make sure the buffer gets reallocated.
+        # Buffers and iterators that are still in use look up the
+        # size of the buffer whenever they access it, and the lock
+        # keeps them from doing so while it is being replaced.
+        with _io_lock:
+            InfoList.PAlwaysPutInt(self._data.List, "nVisPIO",
+                                   [1, 1, 1, 1, 1], [nvis])
+            if self._open:
+                self._data.Close(self._err)
+                pass
+            self._data.Open(3, self._err)
+            if self._err.isErr:
+                raise RuntimeError
+            self._open = True
+            pass
+        return nvis
+
+    def _flags(self, version):
+        """Compile version VERSION of the FG table."""
+
+        table = self.table('FG', version)
+        try:
+            return _AIPSFlags(table)
+        finally:
+            table.close()
+            pass
+        pass
+
+    def calibration(self, name, version):
+        """Load a solution (SN) or calibration (CL) table.
+
+        Returns an object that evaluates the gains, delays and rates
+        in version VERSION of the extension table NAME at arrays of
+        times:
+
+        >>> cal = uvdata.calibration('SN', 1)
+        >>> block = uvdata.read_block(0, 1000)
+        >>> gains = cal.gains(block.ant1, block.time)
+
+        If VERSION is 0, the highest available version is used."""
+
+        if not numpystatus:
+            msg = 'NumPy not available'
+            raise NotImplementedError(msg)
+
+        frequencies = self._frequencies().mean(axis=1)
+        table = self.table(name, version)
+        try:
+            return _AIPSCalibration(table, frequencies)
+        finally:
+            table.close()
+            pass
+        pass
+
+    def _calibrated(self, options):
+        """Return a new Obit object for this data set, opened such
+        that visibilities are selected and calibrated according to
+        the keyword arguments in OPTIONS while being read."""
+
+        data = UV.newPAUV(self._data.Aname, self._data.Aname,
+                          self._data.Aclass, self._data.Disk,
+                          self._data.Aseq, True, self._err)
+        if self._err.isErr:
+            raise RuntimeError
+        nvispio = InfoList.PGet(self._data.List, "nVisPIO")[4][0]
+        InfoList.PAlwaysPutInt(data.List, "nVisPIO", [1, 1, 1, 1, 1],
+                               [nvispio])
+        InfoList.PAlwaysPutBoolean(data.List, "doCalSelect",
+                                   [1, 1, 1, 1, 1], [True])
+        for key in options:
+            name, kind = _calibration_options[key]
+            value = options[key]
+            if not isinstance(value, (list, tuple)):
+                value = [value]
+                pass
+            value = list(value)
+            if kind == int:
+                InfoList.PAlwaysPutInt(data.List, name,
+                                       [len(value), 1, 1, 1, 1],
+                                       [int(x) for x in value])
+            elif kind == float:
+                InfoList.PAlwaysPutFloat(data.List, name,
+                                         [len(value), 1, 1, 1, 1],
+                                         [float(x) for x in value])
+            else:
+                width = max([len(x) for x in value])
+                value = [x.ljust(width) for x in value]
+                InfoList.PAlwaysPutString(data.List, name,
+                                          [width, len(value), 1, 1, 1],
+                                          value)
+                pass
+            continue
+
+        # Open the data set for reading with calibration applied.
+        done = False
+        try:
+            data.Open(4, self._err)
+            if self._err.isErr:
+                raise RuntimeError
+            done = True
+        finally:
+            if not done:
+                _close_quietly(data)
+                pass
+            pass
+        return data
+
+    def iter_blocks(self, nvis=None, writable=False, memory=None,
+                    prefetch=False, flags=None, **kwds):
+        """Iterate over the visibilities in blocks.
+
+        Each block holds up to NVIS visibilities as arrays.  By default
+        a block corresponds to a single I/O buffer.  If MEMORY is
+        specified, the I/O buffer is resized to use that many bytes
+        first.  If WRITABLE is True, each block is written back to the
+        data set once the iteration moves on to the next block or the
+        iterator is closed.  Use the iterator as a context manager to
+        make sure the last block is written back when leaving the loop
+        early:
+
+        >>> with uvdata.iter_blocks(writable=True) as blocks:
+        >>>     for block in blocks:
+        >>>         block.visibility[..., 2] *= 2
+        >>>         break
+
+        If PREFETCH is True, the next block is read by a background
+        thread while the current block is being processed.  Closing
+        the iterator also stops that thread.
+
+        If FLAGS is specified, that version of the FG table is applied
+        to each block.  The 'flags' attribute of a block then holds a
+        boolean array with shape (count, nif, nchan, nstokes) that is
+        True for flagged data, and its 'masked_visibility' attribute
+        presents the visibilities as a masked array.
+
+        Additional keyword arguments make Obit select and calibrate
+        the visibilities while reading them, such that only the
+        selected data is passed on.  The arguments are named after the
+        corresponding AIPS adverbs: DOCALIB, GAINUSE, FLAGVER, DOBAND,
+        BPVER, SMOOTH, DOPOL, BCHAN, ECHAN, BIF, EIF, STOKES, TIMERANG
+        (a pair of times in days), ANTENNAS, SOURCES, SUBARRAY and
+        FREQID.  Blocks read this way cannot be written back."""
+
+        self._sync_cache()
+
+        if memory:
+            self.resize_buffer(memory=memory)
+            pass
+        if kwds:
+            _check_calibration_options(kwds, 'iter_blocks')
+            if writable or prefetch or flags is not None:
+                msg = 'Selected or calibrated visibilities can only be ' \
+                      'read sequentially'
+                raise NotImplementedError(msg)
+            data = self._calibrated(kwds)
+            return _AIPSCalibratedBlockIter(data, self._err, nvis)
+        if not self._open:
+            self._data.Open(3, self._err)
+            self._open = True
+            pass
+        if prefetch:
+            try:
+                uvfile = self._uv_file()
+            except (IOError, OSError, KeyError):
+                uvfile = None
+                pass
+            iter = _AIPSVisibilityPrefetchIter(self._data, self._err, nvis,
+                                               [(0, len(self))], writable,
+                                               uvfile)
+        else:
+            iter = _AIPSVisibilityBlockIter(self._data, self._err, nvis,
+                                            [(0, len(self))], writable)
+            pass
+        if flags is not None:
+            iter.flags = self._flags(flags)
+            pass
+        return iter
 
-    def clrstat(self):
-        """Reset file 'busy' status in the AIPS catalogue."""
-        cno = Obit.AIPSDirFindCNO(self._data.Disk, self._userno,
-                                  self._data.Aname, self._data.Aclass,
-                                  self._type, self._data.Aseq,
-                                  self._err.me)
-        Obit.AIPSDirStatus(self._data.Disk, self._userno, cno, 4, self._err.me)
-        return
+    def memmap(self):
+        """Map the visibilities of this data set into memory.
 
-    def update(self):
-        """Synchronise the data object with the AIPS catalogue entry."""
-        self._obit.PUpdateDesc(self._data, self._err)
-        return
+        Returns a read-only numpy.memmap with one record per
+        visibility, bypassing Obit altogether.  The random parameters
+        are available as fields named after the corresponding 'ptype'
+        header entries and the visibilities themselves as the
+        'visibility' field.  Compressed data sets are not supported."""
 
-    pass                                # class _AIPSData
+        self._sync_cache()
 
+        if not numpystatus:
+            msg = 'NumPy not available'
+            raise NotImplementedError(msg)
 
-class AIPSImage(_AIPSData):
-    """This class is used to access an AIPS image."""
+        desc = self._data.IODesc.Dict
+        if desc['inaxes'][0] == 1:
+            msg = 'Compressed UV data cannot be mapped into memory'
+            raise NotImplementedError(msg)
+        dtype = _uv_dtype(desc)
 
-    def _init(self, name, klass, disk, seq, userno):
-        self._obit = Image
-        self._type = 'MA'
-        if userno == -1:
-            userno = AIPS.userno
+        path = self._uv_file()
+        nvis = int(desc['nvis'])
+        if os.path.getsize(path) < nvis * dtype.itemsize:
+            msg = 'UV data file %s is truncated' % path
+            raise IOError(msg)
+        return np.memmap(path, dtype=dtype, mode='r', shape=(nvis,))
+
+    def _uv_file(self):
+        """Return the path of the file that holds the visibilities."""
+
+        area = 'DA' + ehex(self._data.Disk, 2, '0')
+        pattern = 'UV?%s*.%s;' % (ehex(self._data.Acno, 3, '0'),
+                                  ehex(self._userno, 3, '0'))
+        files = glob.glob(os.path.join(os.environ[area], pattern))
+        if len(files) != 1:
+            msg = 'Cannot locate UV data file for %s.%s.%d' % \
+                  (self.name, self.klass, self.seq)
+            raise IOError(msg)
+        return os.path.abspath(files[0])
+
+    def _index_path(self):
+        """Return the path of the baseline index for this data set and
+        the signature used to check whether it is still valid."""
+
+        uvfile = self._uv_file()
+        stat = os.stat(uvfile)
+        signature = '%d %s %d %.6f %d' % (_index_version, uvfile,
+                                          stat.st_size, stat.st_mtime,
+                                          len(self))
+        name = hashlib.md5(uvfile.encode()).hexdigest() + '.npz'
+        path = os.environ['HOME'] + '/.ParselTongue/index/' + name
+        return (path, signature)
+
+    def _build_index(self):
+        """Build the baseline index for this data set.
+
+        For each baseline, the index holds an entry for every chunk
+        of _index_chunk visibilities in which the baseline occurs,
+        giving the range of visibilities and the range of times it
+        covers within that chunk."""
+
+        parts = []
+        for block in self.iter_blocks():
+            codes = _baseline_code(block.ant1, block.ant2, block.subarray)
+            first = block.first + np.arange(len(block), dtype=np.int64)
+            time = block.time.astype(np.float32)
+            parts.append(_index_entries(codes, first // _index_chunk,
+                                        first, first + 1, time, time))
+            continue
+        if parts:
+            entries = [np.concatenate(arrays) for arrays in zip(*parts)]
+        else:
+            entries = [np.zeros(0, dtype=np.int64)] * 4 + \
+                      [np.zeros(0, dtype=np.float32)] * 2
             pass
-        self._userno = userno
-        self._err = OErr.OErr()
-        self._squeezed = False
-        OSystem.PSetAIPSuser(userno)
-        self._data = Image.newPAImage(name, name, klass, disk, seq,
-                                      True, self._err)
-        if self._err.isErr:
-            raise RuntimeError
-        return
+        codes, chunks, first, last, tmin, tmax = _index_entries(*entries)
+        # Widen the time ranges by a unit in the last place, such that
+        # rounding never excludes a visibility on a boundary.
+        tmin = np.nextafter(tmin, np.float32(-np.inf))
+        tmax = np.nextafter(tmax, np.float32(np.inf))
+        return {'codes': codes, 'first': first, 'last': last,
+                'tmin': tmin, 'tmax': tmax}
+
+    _index = None
+    _writer = None
+    def _baseline_index(self):
+        """Return the baseline index for this data set, building it if
+        necessary.
+
+        The index is stored in ~/.ParselTongue/index such that it can
+        be reused as long as the data set doesn't change.  If the UV
+        data file cannot be located, the index is only kept in
+        memory."""
 
-    def _pixels(self):
-        Obit.ImageRead(self._data.me, self._err.me)
-        if self._err.isErr:
-            raise RuntimeError("Reading image pixels")
-        shape = []
-        for len in self.header['naxis']:
-            if self._squeezed and len == 1:
-                continue
-            shape.insert(0, len)
-            continue
-        shape = tuple(shape)
-        pixels = _array(self._data.PixBuf, shape)
-        return pixels
-    pixels = property(_pixels)
+        try:
+            path, signature = self._index_path()
+        except (IOError, OSError, KeyError):
+            path, signature = None, 'nvis %d' % len(self)
+            pass
+        if self._index and self._index['signature'] == signature:
+            return self._index
 
-    def squeeze(self):
-        """Remove degenerate dimensions from image."""
+        index = None
+        if path and os.path.exists(path):
+            try:
+                f = np.load(path)
+                index = dict([(key, f[key]) for key in f.files])
+                f.close()
+            except Exception:
+                index = None
+                pass
+            if index and str(index['signature']) != signature:
+                index = None
+                pass
+            pass
 
-        self._squeezed = True
-        return
-        
+        if not index:
+            index = self._build_index()
+            index['signature'] = np.array(signature)
+            if path:
+                try:
+                    if not os.path.isdir(os.path.dirname(path)):
+                        os.makedirs(os.path.dirname(path))
+                        pass
+                    tmpname = '%s.%d' % (path, os.getpid())
+                    f = open(tmpname, 'wb')
+                    np.savez(f, **index)
+                    f.close()
+                    os.rename(tmpname, path)
+                except (IOError, OSError):
+                    pass
+            else:
+                msg = 'Cannot locate UV data file for %s.%s.%d; ' \
+                      'the baseline index is not stored on disk' % \
+                      (self.name, self.klass, self.seq)
+                warnings.warn(msg)
+                pass
+            pass
 
-    def attach_table(self, name, version, **kwds):
-        """Attach an extension table to this image.
+        index['signature'] = signature
+        self._index = index
+        return self._index
 
-        A new extension table is created if the extension table NAME
-        with version VERSION doesn't exist.  If VERSION is 0, a new
-        extension table is created with a version that is one higher
-        than the highest available version."""
+    def _remove_index(self):
+        """Remove the baseline index for this data set from disk."""
 
-        if not name.startswith('AIPS '):
-            name = 'AIPS ' + name
+        self._index = None
+        try:
+            path, signature = self._index_path()
+        except (IOError, OSError, KeyError):
+            return
+        if os.path.exists(path):
+            os.remove(path)
+            pass
+        return
 
-        if version == 0:
-            version = Obit.ImageGetHighVer(self._data.me, name) + 1
+    def zap(self, force=False):
+        """Removes the data object from the AIPS catalogue."""
 
-        no_parms = 0
-        if 'no_parms' in kwds:
-            no_parms = kwds['no_parms']
-        data = Obit.ImageCastData(self._data.me)
-        if name == 'AIPS CC':
-            Obit.TableCC(data, [version], 3, name, no_parms, self._err.me)
-        elif name == 'AIPS FG':
-            Obit.TableFG(data, [version], 3, name, self._err.me)
-        elif name == 'AIPS PS':
-            Obit.TablePS(data, [version], 3, name, self._err.me)
-        elif name == 'AIPS SN':
-            Obit.TableSN(data, [version], 3, name,
-                         kwds['no_pol'], kwds['no_if'], self._err.me)
-        else:
-            msg = 'Attaching %s tables is not implemented yet' % name
-            raise NotImplementedError(msg)
-        if self._err.isErr:
-            raise RuntimeError
-        return _AIPSTable(self._data, name, version)
+        self._remove_index()
+        _AIPSData.zap(self, force)
+        return
 
-    history = property(lambda self: _AIPSHistory(self._data))
+    def _map_chunks(self, nchunks):
+        """Split the visibilities into NCHUNKS contiguous chunks of
+        roughly equal size.
 
-    def update(self):
-        Obit.ImageWrite(self._data.me, self._err.me)
-        if self._err.isErr:
-            raise RuntimeError("Writing image pixels")
-        pass
-        _AIPSData.update(self)
+        If the data set has an NX table, the chunks are aligned on
+        scan boundaries."""
 
-    pass                                # class AIPSImage
+        bounds = []
+        try:
+            table = self.table('NX', 0)
+        except IOError:
+            table = None
+            pass
+        if table is not None:
+            try:
+                for row in table:
+                    bounds.append(row.end_vis)
+                    continue
+            finally:
+                table.close()
+                pass
+            pass
+        if not bounds:
+            nvispio = InfoList.PGet(self._data.List, "nVisPIO")[4][0]
+            bounds = list(range(nvispio, len(self), nvispio))
+            pass
+        bounds = sorted(set([b for b in bounds if 0 < b < len(self)]))
+        bounds.append(len(self))
 
+        chunks = []
+        start = 0
+        for bound in bounds:
+            target = (len(chunks) + 1) * len(self) // nchunks
+            if bound >= target or bound == len(self):
+                chunks.append((start, bound))
+                start = bound
+                pass
+            continue
+        return chunks
+
+    def map_reduce(self, func, reducer, nworkers=None, nvis=None):
+        """Apply a function to all visibilities using multiple
+        processes.
+
+        The visibilities are split into NWORKERS chunks, aligned on
+        scans if the data set has an NX table, and on I/O buffers
+        otherwise.  Fewer processes are used if there are not enough
+        scans or buffers for NWORKERS chunks of roughly equal size.
+        Each chunk is handled by a separate process that opens the
+        data set by itself and calls FUNC for each block of up to NVIS
+        visibilities.  The results are combined using REDUCER, which
+        takes two results and returns a combined one.  Returns the
+        combined result for all visibilities.  By default one process
+        per CPU is used.
+
+        The processes are started afresh rather than forked, since
+        Obit cannot be shared with a forked process.  They import the
+        main module of the script, so FUNC and REDUCER have to be
+        defined at the top level of a module, and the script itself
+        should only run from within an "if __name__ == '__main__':"
+        block.  Python versions that cannot start processes this way
+        handle all visibilities in the calling process."""
+
+        if not nworkers:
+            nworkers = multiprocessing.cpu_count()
+            pass
+        self._sync_cache()
+        chunks = self._map_chunks(nworkers)
+        if len(chunks) <= 1 or not hasattr(multiprocessing, 'get_context'):
+            return _map_chunk(self, func, reducer, 0, len(self), nvis)
+
+        tasks = []
+        for start, stop in chunks:
+            tasks.append((self.name, self.klass, self.disk, self.seq,
+                          self.userno, func, reducer, start, stop, nvis))
+            continue
+        context = multiprocessing.get_context('spawn')
+        pool = context.Pool(len(chunks))
+        try:
+            results = pool.map(_map_worker, tasks)
+        finally:
+            pool.terminate()
+            pool.join()
+            pass
+        results = [result for result in results if result is not None]
+        if not results:
+            return None
+        return reduce(reducer, results)
+
+    def _search_time(self, time, side):
+        """Return the position where TIME would have to be inserted to
+        keep the visibilities in time order.
+
+        If SIDE is 'left', the first suitable position is returned,
+        if it is 'right', the last."""
+
+        cache = self._visibility_cache()
+        iloct = self._data.Desc.Dict['iloct']
+        nvispio = cache.nvispio
+
+        # Compare at the precision of the stored times.
+        time = np.float32(time)
+
+        # Find the first block that ends beyond TIME.
+        lo = 0
+        hi = (len(self) + nvispio - 1) // nvispio
+        while lo < hi:
+            mid = (lo + hi) // 2
+            first, records = cache.block(mid * nvispio)
+            last = records[-1, iloct]
+            if last < time or (side == 'right' and last == time):
+                lo = mid + 1
+            else:
+                hi = mid
+                pass
+            continue
+        if lo * nvispio >= len(self):
+            return len(self)
+        first, records = cache.block(lo * nvispio)
+        return first + int(np.searchsorted(records[:, iloct], time, side))
 
-class AIPSUVData(_AIPSData):
-    """This class is used to access an AIPS UV data set."""
+    def time_slice(self, t0, t1):
+        """Select the visibilities between times T0 and T1.
 
-    def _init(self, name, klass, disk, seq, userno):
-        self._obit = UV
-        self._type = 'UV'
-        if userno == -1:
-            userno = AIPS.userno
-        self._userno = userno
-        self._err = OErr.OErr()
-        OSystem.PSetAIPSuser(userno)
-        self._data = UV.newPAUV(name, name, klass, disk, seq, True, self._err)
-        if self._err.isErr:
-            raise RuntimeError
-        self._antennas = []
-        self._polarizations = []
-        self._sources = []
-        self._open = False
-        return
+        The times are in days and the selection includes visibilities
+        at both T0 and T1.  This uses a binary search and requires the
+        data set to be in time order.  Returns a slice that can be
+        iterated over, either by visibility or by block."""
 
-    def __len__(self):
-        return int(self._data.Desc.Dict['nvis'])
+        if not numpystatus:
+            msg = 'NumPy not available'
+            raise NotImplementedError(msg)
+        if not self._data.Desc.Dict['isort'].startswith('T'):
+            msg = 'UV data set is not in time order'
+            raise RuntimeError(msg)
 
-    def __getitem__(self, name):
         if not self._open:
             self._data.Open(3, self._err)
             self._open = True
             pass
-        if type(name) == str:
-            return _AIPSVisibilitySel(self, name)
-        elif type(name) == slice:
-            return _AIPSVisibilitySlice(self, name)
-        return _AIPSVisibility(self._data, self._err, name)
+        start = self._search_time(t0, 'left')
+        stop = max(start, self._search_time(t1, 'right'))
+        return _AIPSVisibilitySlice(self, slice(start, stop))
+
+    def select(self, baseline=None, timerange=None):
+        """Select visibilities by baseline and time range.
+
+        BASELINE is either a single baseline or a list of baselines.
+        A baseline is given as a pair of antenna numbers, optionally
+        followed by a subarray number.  TIMERANGE is a pair of times
+        in days.  The selection is done using an index that is built
+        on first use and kept on disk until the data set changes.  The
+        index records where each baseline occurs in chunks of the data
+        set, such that chunks in which none of the selected baselines
+        occurs within the time range are not read.  Returns a
+        selection that can be iterated over, either by visibility or
+        by block.  The visibilities are read and filtered while
+        iterating over the selection."""
+
+        if not numpystatus:
+            msg = 'NumPy not available'
+            raise NotImplementedError(msg)
 
-    def __iter__(self):
+        self._sync_cache()
         if not self._open:
             self._data.Open(3, self._err)
             self._open = True
             pass
-        return _AIPSVisibilityIter(self._data, self._err)
+        if baseline is None and timerange is None:
+            return _AIPSVisibilitySelection(self, [(0, len(self))],
+                                            None, None)
+
+        index = self._baseline_index()
+        codes = index['codes']
+        wanted = None
+        if baseline is None:
+            entries = np.ones(len(codes), dtype=bool)
+        else:
+            if type(baseline[0]) not in (list, tuple):
+                baseline = [baseline]
+                pass
+            wanted = []
+            for bl in baseline:
+                ant1, ant2 = min(bl[0], bl[1]), max(bl[0], bl[1])
+                if len(bl) > 2:
+                    wanted.append(_baseline_code(ant1, ant2, bl[2]))
+                else:
+                    # Any subarray will do.
+                    match = (codes >> 24) == (ant1 << 12) + ant2
+                    wanted.extend(np.unique(codes[match]).tolist())
+                    pass
+                continue
+            wanted = np.array(wanted, dtype=np.int64)
+            entries = np.zeros(len(codes), dtype=bool)
+            for code in np.unique(wanted):
+                lo = np.searchsorted(codes, code, 'left')
+                hi = np.searchsorted(codes, code, 'right')
+                entries[lo:hi] = True
+                continue
+            pass
+        if timerange:
+            tmin = index['tmin'].astype(np.float64)
+            tmax = index['tmax'].astype(np.float64)
+            entries &= (tmax >= timerange[0]) & (tmin <= timerange[1])
+            pass
+
+        # Merge the ranges of the matching entries, such that only
+        # those ranges are read.
+        first = index['first'][entries]
+        last = index['last'][entries]
+        order = np.argsort(first, kind='mergesort')
+        ranges = []
+        for a, b in zip(first[order].tolist(), last[order].tolist()):
+            if ranges and a <= ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], b))
+            else:
+                ranges.append((a, b))
+                pass
+            continue
+        return _AIPSVisibilitySelection(self, ranges, wanted, timerange)
 
     def _generate_antennas(self):
         """Generate the 'antennas' attribute."""
@@ -1317,6 +4374,8 @@ class AIPSUVData(_AIPSData):
         elif name == 'AIPS NI':
             Obit.TableNI(data, [version], 3, name,
                          kwds['num_coef'], self._err.me)
+        elif name == 'AIPS NX':
+            Obit.TableNX(data, [version], 3, name, self._err.me)
         elif name == 'AIPS PS':
             Obit.TablePS(data, [version], 3, name, self._err.me)
         elif name == 'AIPS SN':
@@ -1333,6 +4392,385 @@ class AIPSUVData(_AIPSData):
 
     history = property(lambda self: _AIPSHistory(self._data))
 
+    def create(cls, name, klass, disk, seq, header, nvis_hint=None,
+               userno=-1):
+        """Create a new UV data set.
+
+        The data set NAME.KLASS.SEQ is created on disk DISK, using the
+        header entries in HEADER, which is either a dictionary or the
+        header of another data set.  The random parameters are given
+        by the 'ptype' entry and the axes of the visibilities by the
+        'naxis', 'ctype', 'crval', 'cdelt' and 'crpix' entries.
+        NVIS_HINT is the expected number of visibilities and is used
+        to size the I/O buffer.  The new data set is returned, open
+        for appending visibilities with append_block().  Call close()
+        when done."""
+
+        if not numpystatus:
+            msg = 'NumPy not available'
+            raise NotImplementedError(msg)
+
+        if userno == -1:
+            userno = AIPS.userno
+            pass
+        if hasattr(header, '_generate_dict'):
+            header = header._generate_dict()
+            pass
+        desc = {}
+        for key in header:
+            if key == 'velref':
+                desc['VelReference'] = header[key] % 256
+                desc['VelDef'] = header[key] // 256
+                continue
+            if not key in _AIPSDataHeader._keys:
+                raise KeyError(key)
+            desc[_AIPSDataHeader._keys[key]] = header[key]
+            continue
+        if 'ptype' in desc:
+            desc['nrparm'] = len(desc['ptype'])
+            pass
+        if 'inaxes' in desc and not 'ndim' in header:
+            desc['naxis'] = len(desc['inaxes'])
+            pass
+
+        # Size the I/O buffer like resize_buffer() does.
+        lrec = _uv_lrec(desc)
+        nvispio = _buffer_memory // (4 * lrec)
+        if nvis_hint:
+            nvispio = min(nvispio, nvis_hint)
+            pass
+        nvispio = int(max(1, nvispio))
+
+        err = OErr.OErr()
+        data = _create_uv(name, klass, disk, seq, userno, desc, nvispio, err)
+        uvdata = cls(data.Aname, data.Aclass, data.Disk,
+                     _created_seq(data, userno, err), userno)
+        uvdata._data = data
+        uvdata._err = err
+        uvdata._open = True
+        uvdata._writer = _AIPSVisibilityWriter(data, err)
+        return uvdata
+    create = classmethod(create)
+
+    def append_block(self, arrays):
+        """Append a block of visibilities to a new data set.
+
+        ARRAYS is either a block of visibilities or a dictionary that
+        maps field names ('u', 'time', 'ant1', 'visibility', ...) to
+        arrays with one element per visibility.  Fields that are not
+        present in a dictionary are set to zero.  This is only
+        possible for data sets returned by create()."""
+
+        if not self._writer:
+            msg = 'UV data set is not open for appending'
+            raise RuntimeError(msg)
+        desc = self._data.Desc.Dict
+        if isinstance(arrays, _AIPSVisibilityBlock):
+            records = arrays._records
+            if records.shape[1] != _uv_lrec(desc):
+                msg = 'Block does not match the layout of the data set'
+                raise ValueError(msg)
+        else:
+            count = max([len(arrays[name]) for name in arrays])
+            records = np.zeros((count, _uv_lrec(desc)), dtype=np.float32)
+            block = _AIPSVisibilityBlock(desc, records, self._writer.count)
+            block._assign(arrays)
+            pass
+        self._writer.write(records)
+        return
+
+    def close(self):
+        """Finish appending visibilities to a new data set.
+
+        This updates the header of the data set, after which it can
+        be accessed like any other data set.  For other data sets,
+        this writes back any changes and closes the data set until
+        the visibilities are accessed again."""
+
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+            self._open = False
+        elif self._open:
+            self._sync_cache()
+            self._data.Close(self._err)
+            if self._err.isErr:
+                raise RuntimeError
+            self._open = False
+            pass
+        return
+
+    def average(self, name=None, klass='AVG', disk=None, seq=0,
+                interval=0.0, channels=1, nvis=None):
+        """Average visibilities in time and frequency.
+
+        Visibilities are averaged per baseline over time intervals of
+        INTERVAL seconds and over groups of CHANNELS channels, using
+        their weights, and are written to the new UV data set
+        NAME.KLASS.SEQ on disk DISK.  This takes a single pass over
+        the data, reading NVIS visibilities at a time.  Averaging in
+        time requires the data set to be in time order.  Visibilities
+        that fall within a quarter of their integration time of the
+        start of an interval are counted in that interval.  Returns
+        the new data set."""
+
+        if not numpystatus:
+            msg = 'NumPy not available'
+            raise NotImplementedError(msg)
+
+        desc = self._data.Desc.Dict
+        if interval and not desc['isort'].startswith('T'):
+            msg = 'UV data set is not in time order'
+            raise RuntimeError(msg)
+        jlocf = desc['jlocf']
+        if channels < 1 or desc['inaxes'][jlocf] % channels:
+            msg = 'Cannot average %d channels in groups of %d' % \
+                  (desc['inaxes'][jlocf], channels)
+            raise ValueError(msg)
+
+        if name is None:
+            name = self.name
+            pass
+        if disk is None:
+            disk = self.disk
+            pass
+
+        # Describe the averaged channels.  The reference frequency is
+        # kept, so the reference pixel moves.
+        inaxes = list(desc['inaxes'])
+        cdelt = list(desc['cdelt'])
+        crpix = list(desc['crpix'])
+        inaxes[jlocf] //= channels
+        cdelt[jlocf] *= channels
+        crpix[jlocf] = 1 + (crpix[jlocf] - (channels + 1) / 2.0) / channels
+        desc['inaxes'] = inaxes
+        desc['cdelt'] = cdelt
+        desc['crpix'] = crpix
+        if interval:
+            desc['isort'] = 'TB'
+            pass
+
+        averager = _AIPSVisibilityAverager(self._data.Desc.Dict,
+                                           interval / 86400.0, channels)
+        nvispio = InfoList.PGet(self._data.List, "nVisPIO")[4][0]
+        data = _create_uv(name, klass, disk, seq, self._userno, desc,
+                          nvispio, self._err)
+        writer = _AIPSVisibilityWriter(data, self._err)
+        try:
+            for block in self.iter_blocks(nvis):
+                writer.write(averager.feed(block))
+                continue
+            writer.write(averager.finish())
+        finally:
+            writer.close()
+            pass
+
+        # Copy the tables that remain valid.  Tables that index
+        # visibilities or channels are left behind.
+        include = ['AIPS AN', 'AIPS FQ', 'AIPS SU', 'AIPS CL', 'AIPS SN',
+                   'AIPS TY', 'AIPS GC', 'AIPS WX']
+        if channels == 1:
+            include += ['AIPS FG', 'AIPS BP']
+            pass
+        UV.PCopyTables(self._data, data, ['AIPS NX'], include, self._err)
+        if self._err.isErr:
+            raise RuntimeError
+
+        uvdata = AIPSUVData(data.Aname, data.Aclass, data.Disk,
+                            _created_seq(data, self._userno, self._err),
+                            self._userno)
+        if channels > 1:
+            try:
+                table = uvdata.table('FQ', 0)
+            except IOError:
+                return uvdata
+            try:
+                for row in table:
+                    widths = _vectorize(row.ch_width)
+                    row.ch_width = [width * channels for width in widths]
+                    row.update()
+                    continue
+            finally:
+                table.close()
+                pass
+            pass
+        return uvdata
+
+    def _frequencies(self):
+        """Return the frequencies of the channels of each IF."""
+
+        header = self._data.Desc.Dict
+        jlocf = header['jlocf']
+        nchan = header['inaxes'][jlocf]
+        nif = 1
+        if header['jlocif'] >= 0:
+            nif = header['inaxes'][header['jlocif']]
+            pass
+        channels = np.arange(1, nchan + 1) - header['crpix'][jlocf]
+        offsets = np.zeros(nif)
+        try:
+            fqtable = self.table('FQ', 0)
+        except IOError:
+            fqtable = None
+            pass
+        if fqtable is not None:
+            if len(fqtable):
+                offsets[:] = _vectorize(fqtable[0].if_freq)
+                pass
+            fqtable.close()
+            pass
+        return header['crval'][jlocf] + offsets[:, np.newaxis] + \
+               channels * header['cdelt'][jlocf]
+
+    def _metadata(self):
+        """Return the metadata written by export()."""
+
+        metadata = {}
+        header = {}
+        for key in self.header._generate_dict():
+            header[key] = self.header[key]
+            continue
+        header['name'] = self.name
+        header['klass'] = self.klass
+        header['seq'] = self.seq
+        metadata['header'] = header
+        for name in ('antennas', 'sources'):
+            try:
+                metadata[name] = getattr(self, name)
+            except IOError:
+                metadata[name] = []
+                pass
+            continue
+        metadata['stokes'] = self.stokes
+        metadata['frequencies'] = self._frequencies()
+        return metadata
+
+    def export(self, path, format='hdf5', chunk=None):
+        """Export the visibilities to a columnar file.
+
+        The visibilities are written to file PATH in FORMAT, which is
+        either 'hdf5' or 'npz', reading CHUNK visibilities at a time.
+        The file holds the columns 'time', 'baseline' (antenna
+        numbers), 'subarray', 'uvw', 'source', 'freqsel', 'inttim' and
+        'visibility', where the latter has shape (nvis, nif, nchan,
+        nstokes, 3).  The header is stored as a JSON string and the
+        antenna names, source names, Stokes parameters and channel
+        frequencies are stored alongside the columns.  HDF5 files are
+        written with chunked and compressed datasets, which requires
+        h5py."""
+
+        if not numpystatus:
+            msg = 'NumPy not available'
+            raise NotImplementedError(msg)
+        if format == 'hdf5':
+            if not h5pystatus:
+                msg = 'h5py not available'
+                raise NotImplementedError(msg)
+            exporter = _AIPSExportHDF5
+        elif format == 'npz':
+            exporter = _AIPSExportNPZ
+        else:
+            msg = "Unknown export format '%s'" % format
+            raise ValueError(msg)
+
+        self._sync_cache()
+        if not self._open:
+            self._data.Open(3, self._err)
+            self._open = True
+            pass
+        if not chunk:
+            chunk = InfoList.PGet(self._data.List, "nVisPIO")[4][0]
+            pass
+
+        exporter = exporter(path, len(self), chunk, self._metadata())
+        try:
+            for block in self.iter_blocks(chunk):
+                exporter.write(_export_columns(block))
+                continue
+        finally:
+            exporter.close()
+            pass
+        return
+
+    def stats(self, by=('baseline', 'if', 'stokes'), nvis=None, flags=None,
+              **kwds):
+        """Compute statistics of the visibilities.
+
+        The statistics are computed in a single pass over the data,
+        grouped by the fields listed in BY, which can be any of
+        'baseline', 'source', 'if', 'channel' and 'stokes'.  Returns
+        a dictionary of arrays.  The first axis of these arrays runs
+        over the baselines and sources, which are listed in the
+        'baseline', 'subarray' and 'source' arrays.  The remaining
+        axes run over the IFs, channels and Stokes parameters that
+        are grouped by, in that order.  The arrays are:
+
+          count            - number of unflagged data points
+          flagged          - number of flagged data points
+          flagged_fraction - fraction of data points that is flagged
+          amp_mean         - mean amplitude
+          amp_rms          - standard deviation of the amplitudes
+          phase_mean       - phase of the vector average, in degrees
+          phase_rms        - circular standard deviation of the
+                             phases, in degrees
+
+        Data points with a weight that is not positive count as
+        flagged.  NVIS, FLAGS and any other keyword arguments are
+        passed on to iter_blocks()."""
+
+        if not numpystatus:
+            msg = 'NumPy not available'
+            raise NotImplementedError(msg)
+
+        _check_calibration_options(kwds, 'stats')
+        statistics = _AIPSStatistics(by)
+        for block in self.iter_blocks(nvis, flags=flags, **kwds):
+            statistics.feed(block, block.flags)
+            continue
+        return statistics.finish()
+
+    def indxr(self, gap=10.0, maxlen=60.0):
+        """Create an index (NX) table for this UV data set.
+
+        This is an in-process replacement for the AIPS task INDXR.  A
+        new scan starts whenever the source, frequency setup or
+        subarray changes, when there is a gap of more than GAP minutes
+        between subsequent visibilities or when a scan would become
+        longer than MAXLEN minutes.  The data set must be in time
+        order.  Returns the version of the new NX table."""
+
+        if not self._data.Desc.Dict['isort'].startswith('T'):
+            msg = 'UV data set is not in time order'
+            raise RuntimeError(msg)
+
+        finder = _AIPSScanFinder(gap / 1440.0, maxlen / 1440.0)
+        for block in self.iter_blocks():
+            finder.feed(block)
+            continue
+        scans = finder.finish()
+
+        table = self.attach_table('NX', 0)
+        try:
+            rows = []
+            for scan in scans:
+                row = AIPSTableRow(table)
+                start_time = float(scan['start_time'])
+                end_time = float(scan['end_time'])
+                row.time = (start_time + end_time) / 2
+                row.time_interval = end_time - start_time
+                row.source_id = int(scan['key'][0])
+                row.freq_id = int(scan['key'][1])
+                row.subarray = int(scan['key'][2])
+                row.start_vis = int(scan['start_vis']) + 1
+                row.end_vis = int(scan['end_vis']) + 1
+                rows.append(row)
+                continue
+            table.extend(rows)
+        finally:
+            table.close()
+            pass
+        return table.version
+
     pass                                # class AIPSUVData
 
 
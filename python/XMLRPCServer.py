@@ -57,7 +57,36 @@ class ServerFuncs:
         self.AIPSCat = Proxy.AIPSData.AIPSCat()
         return
 
+    def _multicall(self, calls):
+        # Handle a batch of calls following the usual system.multicall
+        # conventions.  Results are wrapped in a list, faults are
+        # returned as a struct; a failing call doesn't affect the
+        # other calls.
+        results = []
+        for call in calls:
+            try:
+                name = call['methodName']
+                if name == 'system.multicall':
+                    msg = 'Recursive system.multicall forbidden'
+                    raise ValueError(msg)
+                results.append([self._dispatch(name, call['params'])])
+            except xmlrpc.client.Fault as fault:
+                results.append({'faultCode': fault.faultCode,
+                                'faultString': fault.faultString})
+            except:
+                exc_type, exc_value = sys.exc_info()[:2]
+                results.append({'faultCode': 1,
+                                'faultString': "%s:%s" % (exc_type, exc_value)})
+                pass
+            continue
+        return results
+
     def _dispatch(self, name, args):
+        # Batches of calls sent by AIPS.batch() arrive as a single
+        # system.multicall request.
+        if name == 'system.multicall':
+            return self._multicall(args[0])
+
         # For security reasons, SimpleXMLRPCServer in Python
         # 2.3.5/2.4.1, no longer resolves names with a dot in it.  Se
         # here we explicitly accept names starting with 'AIPS' and
@@ -0,0 +1,67 @@
+import AIPS
+from AIPSTask import AIPSTask
+from AIPSData import AIPSUVData
+from Wizardry.AIPSData import AIPSUVData as WizAIPSUVData
+
+import os
+from parseltest import urlretrieve
+
+AIPS.userno = 1999
+
+# Download a smallish FITS file from the EVN archive.
+url = 'http://archive.jive.nl/exp/N03L1_030225/fits/n03l1_1_1.IDI1'
+file = '/tmp/' + os.path.basename(url)
+if not os.path.isfile(file):
+    urlretrieve(url, file)
+assert(os.path.isfile(file))
+
+name = os.path.basename(url).split('_')[0].upper()
+uvdata = AIPSUVData(name, 'UVDATA', 1, 1)
+if uvdata.exists():
+    uvdata.zap()
+
+fitld = AIPSTask('fitld')
+fitld.datain = file
+fitld.outdata = uvdata
+fitld.msgkill = 2
+fitld.go()
+
+try:
+    uvdata = WizAIPSUVData(name, 'UVDATA', 1, 1, AIPS.userno)
+    weight = 0
+    for block in uvdata.iter_blocks():
+        weight += block.visibility[..., 2].clip(0).sum()
+        continue
+
+    avgdata = uvdata.average(klass='AVG', seq=1, interval=60.0, channels=2)
+    try:
+        assert(0 < len(avgdata) < len(uvdata))
+        assert(avgdata.header.naxis[2] * 2 == uvdata.header.naxis[2])
+        assert(avgdata.header.sortord == 'TB')
+
+        # Averaging should not lose any weight.
+        avgweight = 0
+        for block in avgdata.iter_blocks():
+            avgweight += block.visibility[..., 2].sum()
+            continue
+        assert(abs(avgweight - weight) < 1e-4 * weight)
+    finally:
+        avgdata.zap()
+        pass
+
+    # Reading fewer visibilities at a time than a single interval
+    # holds should give the same result.
+    avgdata = uvdata.average(klass='AVG', seq=1, interval=60.0, channels=2,
+                             nvis=10)
+    try:
+        avgweight = 0
+        for block in avgdata.iter_blocks():
+            avgweight += block.visibility[..., 2].sum()
+            continue
+        assert(abs(avgweight - weight) < 1e-4 * weight)
+    finally:
+        avgdata.zap()
+        pass
+
+finally:
+    uvdata.zap()
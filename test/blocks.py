@@ -0,0 +1,136 @@
+import AIPS
+from AIPSTask import AIPSTask
+from AIPSData import AIPSUVData
+from Wizardry.AIPSData import AIPSUVData as WizAIPSUVData
+
+import os
+from parseltest import urlretrieve
+
+AIPS.userno = 1999
+
+# Download a smallish FITS file from the EVN archive.
+url = 'http://archive.jive.nl/exp/N03L1_030225/fits/n03l1_1_1.IDI1'
+file = '/tmp/' + os.path.basename(url)
+if not os.path.isfile(file):
+    urlretrieve(url, file)
+assert(os.path.isfile(file))
+
+name = os.path.basename(url).split('_')[0].upper()
+uvdata = AIPSUVData(name, 'UVDATA', 1, 1)
+if uvdata.exists():
+    uvdata.zap()
+
+fitld = AIPSTask('fitld')
+fitld.datain = file
+fitld.outdata = uvdata
+fitld.msgkill = 2
+fitld.go()
+
+try:
+    uvdata = WizAIPSUVData(name, 'UVDATA', 1, 1, AIPS.userno)
+    count = 0
+    inttim = 0
+    for block in uvdata.iter_blocks():
+        inttim += block.inttim.sum()
+        count += len(block)
+        continue
+    assert(len(uvdata) == count)
+    assert(inttim == 144132.0)
+
+    # Reading ahead should not make a difference.
+    count = 0
+    inttim = 0
+    for block in uvdata.iter_blocks(nvis=500, prefetch=True):
+        inttim += block.inttim.sum()
+        count += len(block)
+        continue
+    assert(len(uvdata) == count)
+    assert(inttim == 144132.0)
+
+    # Let Obit select a single channel and the parallel hands.
+    count = 0
+    for block in uvdata.iter_blocks(bchan=1, echan=1, stokes='HALF'):
+        assert(block.visibility.shape[2:] == (1, 2, 3))
+        count += len(block)
+        continue
+    assert(0 < count <= len(uvdata))
+
+    # Leaving such an iteration early should close the data set.
+    with uvdata.iter_blocks(bchan=1, echan=1, stokes='HALF') as blocks:
+        for block in blocks:
+            break
+        pass
+    assert(blocks._eof)
+
+    # Statistics should account for every data point.
+    stats = uvdata.stats(by=('baseline', 'if', 'stokes'))
+    block = uvdata.read_block(0, 1)
+    points = stats['count'].sum() + stats['flagged'].sum()
+    assert(points == len(uvdata) * block.visibility[0, ..., 0].size)
+    assert(stats['amp_mean'].shape == stats['baseline'].shape[:1] +
+           block.visibility.shape[1:2] + block.visibility.shape[3:4])
+    assert((stats['amp_rms'] >= 0).all())
+
+    # Smaller buffers should not make a difference.
+    assert(uvdata.resize_buffer(100) == 100)
+    count = 0
+    for block in uvdata.iter_blocks():
+        assert(len(block) <= 100)
+        count += len(block)
+        continue
+    assert(len(uvdata) == count)
+
+    # Neither should resizing the buffer during an iteration.
+    count = 0
+    for block in uvdata.iter_blocks():
+        if count == 0:
+            uvdata.resize_buffer(50)
+            pass
+        count += len(block)
+        continue
+    assert(len(uvdata) == count)
+    uvdata.resize_buffer()
+
+    block = uvdata.read_block(10, 10)
+    assert(len(block) == 10)
+    assert(block.inttim.sum() == 40.0)
+    assert(block.ant1[0] == 3 and block.ant2[0] == 4)
+    assert(block.subarray[0] == 1)
+
+    # Blocks that straddle I/O buffers should match single visibilities.
+    block = uvdata.read_block(990, 20)
+    for i in range(len(block)):
+        vis = uvdata[990 + i]
+        assert(block.time[i] == vis.time)
+        assert([block.ant1[i], block.ant2[i]] == vis.baseline)
+        assert((block.visibility[i] == vis.visibility).all())
+        continue
+
+    # The memory-mapped file should hold the very same visibilities.
+    records = uvdata.memmap()
+    assert(len(records) == len(uvdata))
+    assert((records['TIME1'][990:1010] == block.time).all())
+    assert((records['visibility'][990:1010] == block.visibility).all())
+
+    # Leaving a writable iteration early should write back the
+    # block that was being processed.
+    weight = uvdata[10].visibility[..., 2].sum()
+    with uvdata.iter_blocks(writable=True) as blocks:
+        for block in blocks:
+            block.visibility[..., 2] *= 2
+            break
+        pass
+    uvdata = WizAIPSUVData(name, 'UVDATA', 1, 1, AIPS.userno)
+    assert(uvdata[10].visibility[..., 2].sum() == 2 * weight)
+
+    # The same goes for iterations that read ahead.
+    with uvdata.iter_blocks(writable=True, prefetch=True) as blocks:
+        for block in blocks:
+            block.visibility[..., 2] *= 2
+            break
+        pass
+    uvdata = WizAIPSUVData(name, 'UVDATA', 1, 1, AIPS.userno)
+    assert(uvdata[10].visibility[..., 2].sum() == 4 * weight)
+
+finally:
+    uvdata.zap()
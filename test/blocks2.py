@@ -0,0 +1,61 @@
+import AIPS
+from AIPSTask import AIPSTask
+from AIPSData import AIPSUVData
+from Wizardry.AIPSData import AIPSUVData as WizAIPSUVData
+
+import os
+from parseltest import urlretrieve
+
+AIPS.userno = 1999
+
+# Download a smallish FITS file from the EVN archive.
+url = 'http://archive.jive.nl/exp/N03L1_030225/fits/n03l1_1_1.IDI1'
+file = '/tmp/' + os.path.basename(url)
+if not os.path.isfile(file):
+    urlretrieve(url, file)
+assert(os.path.isfile(file))
+
+name = os.path.basename(url).split('_')[0].upper()
+uvdata = AIPSUVData(name, 'UVDATA', 1, 1)
+if uvdata.exists():
+    uvdata.zap()
+
+fitld = AIPSTask('fitld')
+fitld.datain = file
+fitld.outdata = uvdata
+fitld.msgkill = 2
+fitld.go()
+
+try:
+    uvdata = WizAIPSUVData(name, 'UVDATA', 1, 1, AIPS.userno)
+    weight = uvdata[10].visibility[..., 2].sum()
+    for block in uvdata.iter_blocks(writable=True):
+        block.visibility[..., 2] *= 2
+        continue
+
+    uvdata = WizAIPSUVData(name, 'UVDATA', 1, 1, AIPS.userno)
+    assert(uvdata[10].visibility[..., 2].sum() == 2 * weight)
+
+    block = uvdata.read_block(10, 10)
+    block.inttim = 1.0
+    uvdata.write_block(10, block)
+    uvdata.write_block(20, {'inttim': [1.0] * 10})
+
+    uvdata = WizAIPSUVData(name, 'UVDATA', 1, 1, AIPS.userno)
+    assert(uvdata.read_block(10, 20).inttim.sum() == 20.0)
+
+    # Visibilities accessed by index are written back by flush().
+    for index in (10, 5000, 11):
+        vis = uvdata[index]
+        vis.inttim = 2.0
+        vis.update()
+        continue
+    uvdata.flush()
+
+    uvdata = WizAIPSUVData(name, 'UVDATA', 1, 1, AIPS.userno)
+    assert(uvdata[10].inttim == 2.0)
+    assert(uvdata[11].inttim == 2.0)
+    assert(uvdata[5000].inttim == 2.0)
+
+finally:
+    uvdata.zap()
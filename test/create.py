@@ -0,0 +1,60 @@
+import AIPS
+from AIPSTask import AIPSTask
+from AIPSData import AIPSUVData
+from Wizardry.AIPSData import AIPSUVData as WizAIPSUVData
+
+import os
+from parseltest import urlretrieve
+
+AIPS.userno = 1999
+
+# Download a smallish FITS file from the EVN archive.
+url = 'http://archive.jive.nl/exp/N03L1_030225/fits/n03l1_1_1.IDI1'
+file = '/tmp/' + os.path.basename(url)
+if not os.path.isfile(file):
+    urlretrieve(url, file)
+assert(os.path.isfile(file))
+
+name = os.path.basename(url).split('_')[0].upper()
+uvdata = AIPSUVData(name, 'UVDATA', 1, 1)
+if uvdata.exists():
+    uvdata.zap()
+
+fitld = AIPSTask('fitld')
+fitld.datain = file
+fitld.outdata = uvdata
+fitld.msgkill = 2
+fitld.go()
+
+try:
+    uvdata = WizAIPSUVData(name, 'UVDATA', 1, 1, AIPS.userno)
+    newdata = WizAIPSUVData.create(name, 'COPY', 1, 1, uvdata.header,
+                                   nvis_hint=len(uvdata))
+    try:
+        for block in uvdata.iter_blocks():
+            newdata.append_block(block)
+            continue
+        block = uvdata.read_block(10, 10)
+        newdata.append_block({'time': block.time, 'ant1': block.ant1,
+                              'ant2': block.ant2, 'inttim': block.inttim,
+                              'visibility': block.visibility})
+        newdata.close()
+
+        newdata = WizAIPSUVData(name, 'COPY', 1, 1, AIPS.userno)
+        assert(len(newdata) == len(uvdata) + 10)
+        assert(newdata.header.naxis == uvdata.header.naxis)
+        assert(newdata.header.ptype == uvdata.header.ptype)
+        copy = newdata.read_block(990, 20)
+        block = uvdata.read_block(990, 20)
+        assert((copy.time == block.time).all())
+        assert((copy.visibility == block.visibility).all())
+        copy = newdata.read_block(len(uvdata), 10)
+        assert(copy.inttim.sum() == 40.0)
+        assert(copy.ant1[0] == 3 and copy.ant2[0] == 4)
+        assert((copy.u == 0).all())
+    finally:
+        newdata.zap()
+        pass
+
+finally:
+    uvdata.zap()
@@ -0,0 +1,69 @@
+import AIPS
+from AIPSTask import AIPSTask
+from AIPSData import AIPSUVData
+from Wizardry.AIPSData import AIPSUVData as WizAIPSUVData
+
+import os
+from parseltest import urlretrieve
+
+AIPS.userno = 1999
+
+# Download a smallish FITS file from the EVN archive.
+url = 'http://archive.jive.nl/exp/N03L1_030225/fits/n03l1_1_1.IDI1'
+file = '/tmp/' + os.path.basename(url)
+if not os.path.isfile(file):
+    urlretrieve(url, file)
+assert(os.path.isfile(file))
+
+name = os.path.basename(url).split('_')[0].upper()
+uvdata = AIPSUVData(name, 'UVDATA', 1, 1)
+if uvdata.exists():
+    uvdata.zap()
+
+fitld = AIPSTask('fitld')
+fitld.datain = file
+fitld.outdata = uvdata
+fitld.msgkill = 2
+fitld.go()
+
+try:
+    import numpy as np
+    import tempfile
+
+    uvdata = WizAIPSUVData(name, 'UVDATA', 1, 1, AIPS.userno)
+    block = uvdata.read_block(990, 20)
+
+    path = tempfile.mktemp(suffix='.npz')
+    uvdata.export(path, format='npz', chunk=1000)
+    try:
+        columns = np.load(path)
+        assert(len(columns['time']) == len(uvdata))
+        assert((columns['time'][990:1010] == block.time).all())
+        assert((columns['baseline'][990:1010, 0] == block.ant1).all())
+        assert((columns['visibility'][990:1010] == block.visibility).all())
+        assert(list(columns['antennas']) == uvdata.antennas)
+        assert(columns['frequencies'].shape == block.visibility.shape[1:3])
+    finally:
+        os.remove(path)
+        pass
+
+    try:
+        import h5py
+    except ImportError:
+        h5py = None
+        pass
+    if h5py:
+        path = tempfile.mktemp(suffix='.h5')
+        uvdata.export(path, chunk=1000)
+        try:
+            columns = h5py.File(path, 'r')
+            assert(len(columns['time']) == len(uvdata))
+            assert((columns['visibility'][990:1010] == block.visibility).all())
+            columns.close()
+        finally:
+            os.remove(path)
+            pass
+        pass
+
+finally:
+    uvdata.zap()
@@ -44,6 +44,15 @@ try:
 
     assert(uvdata.header.date_obs == '2003-02-25')
 
+    with AIPS.batch():
+        header = uvdata.header
+        sources = uvdata.sources
+        row = uvdata.table('SU', 1)[0]
+        pass
+    assert(header.result().date_obs == '2003-02-25')
+    assert(len(sources.result()) == 2)
+    assert(row.result().epoch == 2000.0)
+
     sutable = uvdata.table('SU', 1)
     assert(sutable.version == 1)
     assert(sutable[0].epoch == 2000.0)
@@ -63,6 +72,13 @@ try:
     start2 = cltable[0]['time']
     assert(start2 == start)
 
+    rows = cltable.rows(0, 10)
+    assert(len(rows) == min(10, len(cltable)))
+    assert(rows[0].time == start)
+    columns = cltable.columns()
+    assert(len(columns['time']) == len(cltable))
+    assert([row.time for row in cltable] == columns['time'])
+
     assert(uvdata.table_highver('NX') == 1)
     uvdata.table('NX', 0).zap()
     assert(uvdata.table_highver('NX') == 0)
@@ -68,5 +68,39 @@ try:
     
     assert (fgtable[2].ants == [2, 0])
 
+    # Check that Wizardry can read the table as columns.
+    fgtable = uvdata2.table('FG', 0)
+    columns = fgtable.to_arrays()
+    assert (columns['pflags'].shape == (3, 4))
+    assert (columns['pflags'][0].tolist() == [0, 0, 1, 1])
+    assert (columns['ants'][2].tolist() == [2, 0])
+    assert (list(fgtable.column('reason')) == ['TEST'] * 3)
+    fgtable.close()
+
+    # Check that Wizardry applies the flags to blocks of visibilities.
+    uvdata2 = WAIPSUVData(uvdata.name, uvdata.klass, uvdata.disk, uvdata.seq)
+    for block in uvdata2.iter_blocks(flags=0):
+        ant1 = (block.ant1 == 1) | (block.ant2 == 1)
+        ant2 = (block.ant1 == 2) | (block.ant2 == 2)
+        assert(block.flags[ant1, :, 0, 2:].all())
+        assert(block.flags[ant2, :, 0, 2].all())
+        assert(not block.flags[~(ant1 | ant2)].any())
+        assert(not block.flags[:, :, 1:].any())
+        assert(not block.flags[..., :2].any())
+        mask = block.masked_visibility.mask
+        assert(mask.sum() == 3 * block.flags.sum())
+        continue
+
+    # Check that Wizardry can write the table as columns.
+    fgtable = uvdata2.table('FG', 0)
+    fgtable.extend(columns)
+    fgtable.write_rows(3, {'reason': ['COPY'] * 3})
+    fgtable.close()
+    fgtable = uvdata2.table('FG', 0)
+    assert (len(fgtable) == 6)
+    assert (fgtable.column('pflags')[3:].tolist() == columns['pflags'].tolist())
+    assert (list(fgtable.column('reason')) == ['TEST'] * 3 + ['COPY'] * 3)
+    fgtable.close()
+
 finally:
     uvdata.zap()
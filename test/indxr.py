@@ -48,5 +48,17 @@ try:
     indxr()
     assert(len(uvdata.tables) == num_tables)
 
+    # The in-process replacement should cover all visibilities too.
+    uvdata.zap_table('NX', 1)
+    assert(len(uvdata.tables) == num_tables - 1)
+    assert(uvdata.indxr() == 1)
+    assert(len(uvdata.tables) == num_tables)
+    end_vis = 0
+    for row in uvdata.table('NX', 1):
+        assert(row.start_vis == end_vis + 1)
+        end_vis = row.end_vis
+        continue
+    assert(end_vis == len(uvdata))
+
 finally:
     uvdata.zap()
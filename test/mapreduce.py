@@ -0,0 +1,64 @@
+import AIPS
+from AIPSTask import AIPSTask
+from AIPSData import AIPSUVData
+from Wizardry.AIPSData import AIPSUVData as WizAIPSUVData
+
+import operator, os
+from parseltest import urlretrieve
+
+# The worker processes import this script, so the functions they
+# call have to be defined at the top level and the test itself has
+# to be protected from being run again.
+def inttim(block):
+    return block.inttim.sum()
+
+def fail(block):
+    raise ValueError('Failing on purpose')
+
+if __name__ == '__main__':
+    AIPS.userno = 1999
+
+    # Download a smallish FITS file from the EVN archive.
+    url = 'http://archive.jive.nl/exp/N03L1_030225/fits/n03l1_1_1.IDI1'
+    file = '/tmp/' + os.path.basename(url)
+    if not os.path.isfile(file):
+        urlretrieve(url, file)
+    assert(os.path.isfile(file))
+
+    name = os.path.basename(url).split('_')[0].upper()
+    uvdata = AIPSUVData(name, 'UVDATA', 1, 1)
+    if uvdata.exists():
+        uvdata.zap()
+
+    fitld = AIPSTask('fitld')
+    fitld.datain = file
+    fitld.outdata = uvdata
+    fitld.msgkill = 2
+    fitld.go()
+
+    try:
+        uvdata = WizAIPSUVData(name, 'UVDATA', 1, 1, AIPS.userno)
+
+        # Spreading the work over multiple processes should not make
+        # a difference.
+        count = uvdata.map_reduce(len, operator.add, nworkers=3)
+        assert(len(uvdata) == count)
+        total = uvdata.map_reduce(inttim, operator.add, nworkers=3)
+        assert(total == 144132.0)
+
+        # Not even while the data set is open in this process.
+        for block in uvdata.iter_blocks(prefetch=True):
+            count = uvdata.map_reduce(len, operator.add, nworkers=3)
+            assert(len(uvdata) == count)
+            break
+
+        # Errors in the workers should be passed on.
+        try:
+            uvdata.map_reduce(fail, operator.add, nworkers=3)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('map_reduce() did not fail')
+
+    finally:
+        uvdata.zap()
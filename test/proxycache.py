@@ -0,0 +1,50 @@
+from AIPS import AIPS
+from AIPSTask import AIPSTask
+from AIPSData import AIPSImage
+from Wizardry.AIPSData import AIPSImage as WizAIPSImage
+
+AIPS.userno = 1999
+
+image = AIPSImage('MANDELBROT', 'MANDL', 1, 1)
+if image.exists():
+    image.zap()
+
+mandl = AIPSTask('mandl')
+mandl.outdata = image
+mandl.imsize[1:] = [ 512, 512 ]
+mandl.go()
+
+apple = AIPSImage('APPLE', 'MANDL', 1, 1)
+try:
+    # The proxy caches the data set between these calls.
+    assert(image.header.naxis[0] == 512)
+    assert(image.header.naxis[0] == 512)
+
+    # Renaming it behind the back of the proxy should be noticed.
+    WizAIPSImage('MANDELBROT', 'MANDL', 1, 1).rename('APPLE')
+    try:
+        image.header
+    except Exception:
+        pass
+    else:
+        raise AssertionError("Renamed image is still accessible")
+    assert(apple.header.naxis[0] == 512)
+
+    # As should replacing it by a new one.
+    WizAIPSImage('APPLE', 'MANDL', 1, 1).zap()
+    try:
+        apple.header
+    except Exception:
+        pass
+    else:
+        raise AssertionError("Zapped image is still accessible")
+    mandl.outdata = apple
+    mandl.imsize[1:] = [ 256, 256 ]
+    mandl.go()
+    assert(apple.header.naxis[0] == 256)
+finally:
+    for data in (image, apple):
+        if data.exists():
+            data.zap()
+            pass
+        continue
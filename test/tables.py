@@ -0,0 +1,73 @@
+from AIPS import AIPS
+from AIPSTask import AIPSTask
+from AIPSData import AIPSUVData
+from Wizardry.AIPSData import AIPSUVData as WizAIPSUVData
+
+import os
+from parseltest import urlretrieve
+
+AIPS.userno = 1999
+
+# Download a smallish FITS file from the EVN archive.
+url = 'http://archive.jive.nl/exp/N03L1_030225/fits/n03l1_1_1.IDI1'
+file = '/tmp/' + os.path.basename(url)
+if not os.path.isfile(file):
+    urlretrieve(url, file)
+assert(os.path.isfile(file))
+
+name = os.path.basename(url).split('_')[0].upper()
+uvdata = AIPSUVData(name, 'UVDATA', 1, 1)
+if uvdata.exists():
+    uvdata.zap()
+    pass
+
+fitld = AIPSTask('fitld')
+fitld.datain = file
+fitld.outdata = uvdata
+fitld.msgkill = 2
+fitld.go()
+
+try:
+    uvdata = WizAIPSUVData(name, 'UVDATA', 1, 1)
+
+    # Look up sources by name.
+    sutable = uvdata.table('SU', 0)
+    index = sutable.index('source')
+    for row in sutable:
+        rows = index.lookup(row.source)
+        assert(len(rows) == 1)
+        assert(rows[0].id__no == row.id__no)
+        continue
+    assert(index.lookup('NOSUCHSOURCE') == [])
+    sutable.close()
+
+    # Look up calibration entries by antenna and time.
+    cltable = uvdata.table('CL', 0)
+    index = cltable.index(['antenna_no', 'time'])
+    columns = cltable.to_arrays(['antenna_no', 'time'])
+    for antenna in set(columns['antenna_no'].tolist()):
+        times = columns['time'][columns['antenna_no'] == antenna]
+        row = index.nearest(antenna, times.min() - 1.0)
+        assert(row.antenna_no == antenna)
+        assert(row.time == times.min())
+        row = index.nearest(antenna, times.max() + 1.0)
+        assert(row.time == times.max())
+        rows = index.range(antenna, times.min(), times.max())
+        assert(len(rows) == len(times))
+        assert([row.time for row in rows] == sorted(times.tolist()))
+        continue
+    cltable.close()
+
+    # Evaluate the calibration entries for a block of visibilities.
+    cal = uvdata.calibration('CL', 0)
+    block = uvdata.read_block(0, 100)
+    for method in ('nearest', 'linear', 'ambig'):
+        gains = cal.gains(block.ant1, block.time, method)
+        assert(gains.shape == (100, cal.nif, cal.npol))
+        assert(abs(abs(gains) - 1.0).max() < 1e-5)
+        delays = cal.delays(block.ant2, block.time, method)
+        assert(delays.shape == gains.shape)
+        continue
+
+finally:
+    uvdata.zap()
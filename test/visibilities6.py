@@ -0,0 +1,107 @@
+import AIPS
+from AIPSTask import AIPSTask
+from AIPSData import AIPSUVData
+from Wizardry.AIPSData import AIPSUVData as WizAIPSUVData
+
+import os
+from parseltest import urlretrieve
+
+AIPS.userno = 1999
+
+# Download a smallish FITS file from the EVN archive.
+url = 'http://archive.jive.nl/exp/N03L1_030225/fits/n03l1_1_1.IDI1'
+file = '/tmp/' + os.path.basename(url)
+if not os.path.isfile(file):
+    urlretrieve(url, file)
+assert(os.path.isfile(file))
+
+name = os.path.basename(url).split('_')[0].upper()
+uvdata = AIPSUVData(name, 'UVDATA', 1, 1)
+if uvdata.exists():
+    uvdata.zap()
+
+fitld = AIPSTask('fitld')
+fitld.datain = file
+fitld.outdata = uvdata
+fitld.msgkill = 2
+fitld.go()
+
+try:
+    uvdata = WizAIPSUVData(name, 'UVDATA', 1, 1, AIPS.userno)
+    count = 0
+    inttim = 0
+    for vis in uvdata[10:20:2]:
+        inttim += vis.inttim
+        count += 1
+        continue
+    assert(count == 5)
+    assert(inttim == 20.0)
+
+    times = [uvdata[index].time for index in (2167, 4, 3)]
+    count = 0
+    for vis in uvdata[[2167, 4, 3]]:
+        assert(vis.time == times[count])
+        count += 1
+        continue
+    assert(count == 3)
+
+    mask = [False] * len(uvdata)
+    mask[4] = mask[2167] = True
+    count = 0
+    for block in uvdata[mask].iter_blocks():
+        assert(list(block.indices) == [4, 2167])
+        assert(block.ant1[1] == 2 and block.ant2[1] == 4)
+        count += len(block)
+        continue
+    assert(count == 2)
+
+    count = 0
+    for vis in uvdata:
+        if vis.baseline == [2, 4]:
+            count += 1
+            pass
+        continue
+    selection = uvdata.select(baseline=(2, 4))
+    assert(len(selection) == count)
+    for block in selection.iter_blocks():
+        assert((block.ant1 == 2).all() and (block.ant2 == 4).all())
+        continue
+
+    # The second time around the index is read back from disk.
+    uvdata = WizAIPSUVData(name, 'UVDATA', 1, 1, AIPS.userno)
+    time = uvdata[2167].time
+    selection = uvdata.select(baseline=(2, 4), timerange=(time, time))
+    indices = []
+    for block in selection.iter_blocks():
+        indices.extend(block.indices)
+        continue
+    assert(2167 in indices)
+    count = 0
+    for vis in selection:
+        assert(vis.time == time and vis.baseline == [2, 4])
+        count += 1
+        continue
+    assert(count == len(indices))
+
+    count = 0
+    for vis in uvdata.time_slice(time, time):
+        assert(vis.time == time)
+        count += 1
+        continue
+    assert(count > 0)
+    for block in uvdata.time_slice(time - 0.01, time + 0.01).iter_blocks():
+        assert((abs(block.time - time) <= 0.01 + 1e-6).all())
+        continue
+
+    # Iterators and random access should not get in each other's way.
+    times = uvdata.memmap()['TIME1']
+    first = iter(uvdata)
+    second = iter(uvdata[2000:])
+    for index in range(1000):
+        assert(next(first).time == times[index])
+        assert(next(second).time == times[2000 + index])
+        assert(uvdata[3 * index].time == times[3 * index])
+        continue
+
+finally:
+    uvdata.zap()